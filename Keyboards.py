@@ -19,15 +19,73 @@ def main_menu_keyboard():
     builder.adjust(2, 2, 1)
     return builder.as_markup(resize_keyboard=True)
 
-def task_actions_keyboard(task_id: int):
+# Варианты для inline-редактирования: (текст кнопки, значение в БД)
+PRIORITY_OPTIONS = [
+    ("Высокий 🔴", "Высокий"),
+    ("Средний 🟡", "Средний"),
+    ("Низкий 🟢", "Низкий"),
+    ("❌ Без приоритета", None),
+]
+REPEAT_OPTIONS = ["Нет", "Ежедневно", "Еженедельно", "Ежемесячно"]
+CATEGORY_PAGE_SIZE = 8
+
+def task_actions_keyboard(task_id: int, done: bool = False):
     """Действия с задачей"""
     builder = InlineKeyboardBuilder()
     
-    builder.button(text="✅ Выполнено", callback_data=f"done_{task_id}")
+    if not done:
+        builder.button(text="✅ Выполнено", callback_data=f"done_{task_id}")
     builder.button(text="✏️ Редактировать", callback_data=f"edit_{task_id}")
     builder.button(text="❌ Удалить", callback_data=f"delete_{task_id}")
     
-    builder.adjust(1, 2)
+    if done:
+        builder.adjust(2)
+    else:
+        builder.adjust(1, 2)
+    return builder.as_markup()
+
+def confirm_delete_keyboard(task_id: int):
+    """Подтверждение удаления задачи"""
+    builder = InlineKeyboardBuilder()
+    
+    builder.button(text="✅ Да, удалить", callback_data=f"confirm_delete_{task_id}")
+    builder.button(text="❌ Нет, отменить", callback_data=f"cancel_delete_{task_id}")
+    
+    builder.adjust(2)
+    return builder.as_markup()
+
+def edit_fields_keyboard(task_id: int):
+    """Выбор что редактировать (на карточке задачи)"""
+    builder = InlineKeyboardBuilder()
+    
+    builder.button(text="📝 Текст", callback_data=f"editfield_text_{task_id}")
+    builder.button(text="⏰ Дедлайн", callback_data=f"editfield_deadline_{task_id}")
+    builder.button(text="🏷️ Категория", callback_data=f"editfield_category_{task_id}")
+    builder.button(text="⚡ Приоритет", callback_data=f"editfield_priority_{task_id}")
+    builder.button(text="🔄 Повторение", callback_data=f"editfield_repeat_{task_id}")
+    builder.button(text="↩️ Назад", callback_data=f"editback_{task_id}")
+    
+    builder.adjust(2, 2, 2)
+    return builder.as_markup()
+
+def edit_options_keyboard(task_id: int, field: str):
+    """Варианты значения приоритета или повторения (на карточке задачи)"""
+    builder = InlineKeyboardBuilder()
+    
+    labels = [label for label, _ in PRIORITY_OPTIONS] if field == "priority" else REPEAT_OPTIONS
+    for index, label in enumerate(labels):
+        builder.button(text=label, callback_data=f"setfield_{field}_{task_id}_{index}")
+    builder.button(text="↩️ Назад", callback_data=f"editback_{task_id}")
+    
+    builder.adjust(2, 2, 1)
+    return builder.as_markup()
+
+def edit_back_keyboard(task_id: int):
+    """Возврат к карточке задачи во время ввода нового значения"""
+    builder = InlineKeyboardBuilder()
+    
+    builder.button(text="↩️ Назад", callback_data=f"editback_{task_id}")
+    
     return builder.as_markup()
 
 def priority_keyboard():
@@ -54,20 +112,6 @@ def repeat_keyboard():
     builder.adjust(2, 2)
     return builder.as_markup(resize_keyboard=True, one_time_keyboard=True)
 
-def edit_choice_keyboard():
-    """Выбор что редактировать"""
-    builder = ReplyKeyboardBuilder()
-    
-    builder.button(text="📝 Текст")
-    builder.button(text="⏰ Дедлайн")
-    builder.button(text="🏷️ Категория")
-    builder.button(text="⚡ Приоритет")
-    builder.button(text="🔄 Повторение")
-    builder.button(text="❌ Отмена")
-    
-    builder.adjust(2, 2, 2)
-    return builder.as_markup(resize_keyboard=True, one_time_keyboard=True)
-
 def cancel_keyboard():
     """Клавиатура с отменой"""
     builder = ReplyKeyboardBuilder()
@@ -76,19 +120,44 @@ def cancel_keyboard():
     
     return builder.as_markup(resize_keyboard=True, one_time_keyboard=True)
 
-def categories_keyboard(categories):
-    """Клавиатура с категориями пользователя"""
+def categories_keyboard(categories, more=False):
+    """Клавиатура с самыми используемыми категориями пользователя"""
     builder = ReplyKeyboardBuilder()
     
-    for category in categories[:8]:  # Ограничиваем 8 категориями
+    for category in categories[:CATEGORY_PAGE_SIZE]:
         builder.button(text=category)
     
+    if more:
+        builder.button(text="📂 Другие категории")
     builder.button(text="➕ Новая категория")
     builder.button(text="❌ Без категории")
     
     builder.adjust(2)
     return builder.as_markup(resize_keyboard=True, one_time_keyboard=True)
 
+def category_page_keyboard(categories, offset, more, back_data=None):
+    """Страница категорий для выбора inline-кнопками; categories — пары (имя, callback_data)"""
+    builder = InlineKeyboardBuilder()
+    
+    for category, callback_data in categories:
+        builder.button(text=category, callback_data=callback_data)
+    
+    navigation = 0
+    if offset > 0:
+        builder.button(text="⬅️ Предыдущие", callback_data=f"catpage_{max(offset - CATEGORY_PAGE_SIZE, 0)}")
+        navigation += 1
+    if more:
+        builder.button(text="➡️ Ещё", callback_data=f"catpage_{offset + CATEGORY_PAGE_SIZE}")
+        navigation += 1
+    if back_data:
+        builder.button(text="↩️ Назад", callback_data=back_data)
+    
+    sizes = [2] * (len(categories) // 2) + [1] * (len(categories) % 2)
+    if navigation:
+        sizes.append(navigation)
+    builder.adjust(*sizes, 1)
+    return builder.as_markup()
+
 def back_to_menu_keyboard():
     """Кнопка возврата в меню"""
     builder = ReplyKeyboardBuilder()
@@ -101,6 +170,9 @@ def filter_keyboard():
     """Фильтрация задач"""
     builder = ReplyKeyboardBuilder()
     
+    builder.button(text="📅 Сегодня")
+    builder.button(text="🗓 Эта неделя")
+    builder.button(text="⚠️ Просрочено")
     builder.button(text="📋 Все задачи")
     builder.button(text="✅ Выполненные")
     builder.button(text="❌ Невыполненные")
@@ -108,7 +180,7 @@ def filter_keyboard():
     builder.button(text="🔴 Высокий приоритет")
     builder.button(text="🏠 Главное меню")
     
-    builder.adjust(2, 2, 2)
+    builder.adjust(3, 2, 2, 2)
     return builder.as_markup(resize_keyboard=True)
 
 def deadline_keyboard():
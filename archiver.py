@@ -0,0 +1,35 @@
+import asyncio
+from db_handler import db
+from config import ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SIZE, ARCHIVE_INTERVAL, CHANGE_LOG_KEEP
+import logging
+
+logger = logging.getLogger(__name__)
+
+async def archive_loop():
+    """Цикл переноса старых выполненных задач в архив"""
+    logger.info("📦 Запущен цикл архивации")
+    
+    while True:
+        try:
+            total = 0
+            
+            # Переносим пачками, отдавая управление циклу событий между транзакциями
+            while True:
+                moved = db.archive_completed_tasks(ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SIZE)
+                total += moved
+                
+                if moved < ARCHIVE_BATCH_SIZE:
+                    break
+                
+                await asyncio.sleep(0)
+            
+            if total:
+                logger.info(f"📦 Архивация завершена, перенесено задач: {total}")
+            
+            db.compact_changes(CHANGE_LOG_KEEP)
+            
+            await asyncio.sleep(ARCHIVE_INTERVAL)
+            
+        except Exception as e:
+            logger.error(f"❌ Критическая ошибка в archive_loop: {e}")
+            await asyncio.sleep(300)  # Ждем 5 минут при ошибке
\ No newline at end of file
@@ -0,0 +1,92 @@
+import asyncio
+import gzip
+import os
+import shutil
+import sqlite3
+import time
+from datetime import datetime
+from db_handler import db
+from config import BACKUP_DIR, BACKUP_INTERVAL, BACKUP_KEEP, BACKUP_PAGES_PER_STEP, BACKUP_STEP_SLEEP
+import logging
+
+logger = logging.getLogger(__name__)
+
+BACKUP_PREFIX = "tasks-"
+BACKUP_SUFFIX = ".db.gz"
+
+def backup_database(source, target_dir, pages_per_step=256, step_sleep=0.05):
+    """Копия базы через backup API по частям со сжатием: (файл, страниц, размер)"""
+    os.makedirs(target_dir, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    raw_path = os.path.join(target_dir, f"{BACKUP_PREFIX}{stamp}.db")
+    gz_path = raw_path + ".gz"
+    progress = {"pages": 0}
+    
+    def on_progress(status, remaining, total):
+        progress["pages"] = total
+    
+    # Источник — соединение бота: его изменения между шагами SQLite переносит в копию сам.
+    # С отдельным соединением каждая запись бота начинала бы копирование заново
+    target = sqlite3.connect(raw_path)
+    try:
+        source.backup(target, pages=pages_per_step, progress=on_progress, sleep=step_sleep)
+    finally:
+        target.close()
+    
+    try:
+        with open(raw_path, "rb") as src, gzip.open(gz_path, "wb", compresslevel=6) as dst:
+            shutil.copyfileobj(src, dst)
+    finally:
+        os.remove(raw_path)
+    
+    return gz_path, progress["pages"], os.path.getsize(gz_path)
+
+def list_backups(target_dir):
+    """Файлы резервных копий, от старых к новым"""
+    if not os.path.isdir(target_dir):
+        return []
+    names = sorted(
+        name for name in os.listdir(target_dir)
+        if name.startswith(BACKUP_PREFIX) and name.endswith(BACKUP_SUFFIX)
+    )
+    return [os.path.join(target_dir, name) for name in names]
+
+def prune_backups(target_dir, keep):
+    """Удаление старых копий сверх keep последних, возвращает число удалённых"""
+    expired = list_backups(target_dir)[:-keep] if keep > 0 else []
+    for path in expired:
+        os.remove(path)
+    return len(expired)
+
+async def run_backup():
+    """Одна резервная копия в рабочем потоке, чтобы не блокировать обработчики"""
+    started = time.monotonic()
+    path, pages, size = await asyncio.to_thread(
+        backup_database, db.conn, BACKUP_DIR, BACKUP_PAGES_PER_STEP, BACKUP_STEP_SLEEP
+    )
+    removed = prune_backups(BACKUP_DIR, BACKUP_KEEP)
+    
+    logger.info(
+        f"💾 Резервная копия {path}: {pages} страниц за {time.monotonic() - started:.1f} с, "
+        f"{size / 1024:.0f} КБ, удалено старых: {removed}"
+    )
+    return path
+
+async def backup_loop():
+    """Цикл резервного копирования по расписанию"""
+    logger.info("💾 Запущен цикл резервного копирования")
+    
+    # После перезапуска не делаем копию раньше срока
+    backups = list_backups(BACKUP_DIR)
+    if backups:
+        age = time.time() - os.path.getmtime(backups[-1])
+        await asyncio.sleep(max(BACKUP_INTERVAL - age, 0))
+    
+    while True:
+        try:
+            await run_backup()
+            await asyncio.sleep(BACKUP_INTERVAL)
+        
+        except Exception as e:
+            logger.error(f"❌ Ошибка резервного копирования: {e}")
+            await asyncio.sleep(300)  # Ждем 5 минут при ошибке
\ No newline at end of file
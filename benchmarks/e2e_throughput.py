@@ -0,0 +1,61 @@
+"""Сквозная пропускная способность бота: настоящий polling против локального Bot API.
+
+Бот запускается в этом же процессе на временной базе данных и опрашивает
+поддельный сервер из fake_bot_api.py, синтетические пользователи ждут его ответов.
+
+Запуск из корня проекта:
+    python benchmarks/e2e_throughput.py --users 500 --rounds 3 --no-flood
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fake_bot_api import FakeBotAPI, run_load, start_server
+
+async def main(args):
+    from aiogram import Bot
+    from aiogram.client.telegram import TelegramAPIServer
+
+    import bot as app
+    from db_handler import db
+    from http_session import create_bot_session
+
+    api = FakeBotAPI(flood=not args.no_flood)
+    runner, url = await start_server(api)
+    bot = Bot(token="42:E2E", session=create_bot_session(api=TelegramAPIServer.from_base(url)))
+
+    polling = asyncio.create_task(app.dp.start_polling(bot, handle_signals=False))
+    try:
+        await api.polling.wait()
+        stats = await run_load(api, args.users, args.rounds, args.think, args.reply_timeout)
+        print(stats.report(api))
+        print(f"🌐 HTTP-сессия бота: {bot.session.stats.snapshot()}")
+    finally:
+        await app.dp.stop_polling()
+        await polling
+        await runner.cleanup()
+        db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=500, help="число синтетических пользователей")
+    parser.add_argument("--rounds", type=int, default=3, help="сценариев на пользователя")
+    parser.add_argument("--think", type=float, default=0.0, help="средняя пауза между действиями (сек)")
+    parser.add_argument("--reply-timeout", type=float, default=10.0, help="ожидание ответа бота (сек)")
+    parser.add_argument("--no-flood", action="store_true", help="отключить лимиты 429")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+    with tempfile.TemporaryDirectory() as tmp:
+        # Настройки читаются при импорте бота, поэтому задаются заранее:
+        # временная база и копии, без HTTP-сервера проверок состояния
+        os.environ["DB_PATH"] = os.path.join(tmp, "e2e.db")
+        os.environ["BACKUP_DIR"] = os.path.join(tmp, "backups")
+        os.environ["HEALTH_PORT"] = "0"
+        asyncio.run(main(args))
\ No newline at end of file
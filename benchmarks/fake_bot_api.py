@@ -0,0 +1,354 @@
+"""Локальный сервер Bot API для сквозных нагрузочных тестов без сети и токена.
+
+Реализует getMe, getUpdates (long polling), sendMessage, editMessageText,
+editMessageReplyMarkup, answerCallbackQuery и deleteWebhook. Сообщения
+ограничиваются как в Telegram: около 1 в секунду на чат и 30 в секунду всего,
+сверх лимита — ответ 429 с parameters.retry_after.
+
+Синтетические пользователи проходят сценарии (кнопки меню, создание задач,
+брошенные диалоги, нажатия inline-кнопок) и ждут ответа бота перед следующим шагом.
+
+Запуск сервера с нагрузкой:
+    python benchmarks/fake_bot_api.py --users 1000 --port 8081
+Бот в другом терминале:
+    BOT_API_URL=http://127.0.0.1:8081 BOT_TOKEN=42:TEST DB_PATH=/tmp/bench.db python bot.py
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+from collections import Counter, defaultdict
+
+from aiohttp import web
+
+BOT_USER = {"id": 42, "is_bot": True, "first_name": "FakeBot", "username": "fake_todo_bot"}
+MESSAGE_METHODS = {"sendMessage", "editMessageText", "editMessageReplyMarkup"}
+
+# Сценарии пользователей: ("text", текст) — сообщение, ("tap", префикс) — нажатие inline-кнопки
+SCENARIOS = {
+    "browse": [
+        ("text", "📋 Мои задачи"),
+        ("text", "📋 Все задачи"),
+        ("tap", "done_"),
+        ("text", "🏠 Главное меню"),
+    ],
+    "add": [
+        ("text", "➕ Создать задачу"),
+        ("text", "Задача {n}"),
+        ("text", "❌ Без дедлайна"),
+        ("text", "Личное"),
+        ("text", "Средний 🟡"),
+        ("text", "Нет"),
+    ],
+    "abandon": [
+        ("text", "➕ Создать задачу"),
+        ("text", "Черновик {n}"),
+        ("text", "❌ Отмена"),
+    ],
+    "stats": [
+        ("text", "📊 Статистика"),
+    ],
+    "search": [
+        ("text", "🔍 Поиск задач"),
+        ("text", "Задача"),
+    ],
+}
+
+class TokenBucket:
+    """Лимит частоты: rate событий в секунду с запасом burst"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def acquire(self):
+        """0, если событие разрешено, иначе сколько секунд ждать"""
+        now = time.monotonic()
+        self.tokens = min(float(self.burst), self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+class FakeBotAPI:
+    """Состояние поддельного Bot API: очередь обновлений, чаты, лимиты и статистика"""
+
+    def __init__(self, flood=True, chat_rate=1.0, chat_burst=3, global_rate=30.0):
+        self.flood = flood
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_buckets = {}
+        self.updates = []            # Неподтверждённые обновления
+        self.next_update_id = 1
+        self.new_updates = asyncio.Condition()
+        self.polling = asyncio.Event()             # Бот начал опрашивать getUpdates
+        self.message_ids = defaultdict(int)        # chat_id -> последний message_id
+        self.buttons = defaultdict(dict)           # chat_id -> {message_id: [callback_data]}
+        self.replies = defaultdict(asyncio.Event)  # chat_id -> бот ответил на последнее обновление
+        self.callback_chats = {}                   # callback_query_id -> chat_id
+        self.calls = Counter()
+        self.flood_errors = Counter()
+        self.delivered = 0
+
+    def app(self):
+        """aiohttp-приложение с маршрутом /bot{token}/{method}"""
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        return app
+
+    async def handle(self, request):
+        method = request.match_info["method"]
+        params = dict(await request.post())
+        self.calls[method] += 1
+
+        handler = getattr(self, f"api_{method}", None)
+        if handler is None:
+            return self.ok(True)
+
+        if method in MESSAGE_METHODS:
+            chat_id = int(params["chat_id"])
+            self.replies[chat_id].set()
+            retry_after = self.check_flood(chat_id)
+            if retry_after:
+                self.flood_errors[method] += 1
+                return web.json_response({
+                    "ok": False,
+                    "error_code": 429,
+                    "description": f"Too Many Requests: retry after {retry_after}",
+                    "parameters": {"retry_after": retry_after},
+                })
+
+        return self.ok(await handler(params))
+
+    def ok(self, result):
+        return web.json_response({"ok": True, "result": result})
+
+    def check_flood(self, chat_id):
+        """Целое число секунд до повтора, если сообщение превышает лимит, иначе 0"""
+        if not self.flood:
+            return 0
+
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self.chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+
+        wait = bucket.acquire() or self.global_bucket.acquire()
+        return math.ceil(wait)
+
+    def message(self, chat_id, text, message_id=None, sender=BOT_USER):
+        """Объект Message в формате Bot API"""
+        if message_id is None:
+            self.message_ids[chat_id] += 1
+            message_id = self.message_ids[chat_id]
+        return {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": sender,
+            "text": text,
+        }
+
+    def remember_buttons(self, chat_id, message_id, params):
+        """Inline-кнопки из reply_markup, чтобы синтетический пользователь мог их нажать"""
+        markup = json.loads(params.get("reply_markup") or "{}")
+        callbacks = [
+            button["callback_data"]
+            for row in markup.get("inline_keyboard", [])
+            for button in row
+            if "callback_data" in button
+        ]
+        if callbacks:
+            self.buttons[chat_id][message_id] = callbacks
+        else:
+            self.buttons[chat_id].pop(message_id, None)
+
+    # --- Методы Bot API ---
+
+    async def api_getMe(self, params):
+        return BOT_USER
+
+    async def api_deleteWebhook(self, params):
+        return True
+
+    async def api_getUpdates(self, params):
+        offset = int(params.get("offset", 0))
+        limit = int(params.get("limit", 100))
+        timeout = float(params.get("timeout", 0))
+        self.polling.set()
+
+        async with self.new_updates:
+            self.updates = [u for u in self.updates if u["update_id"] >= offset]
+            if not self.updates and timeout:
+                try:
+                    await asyncio.wait_for(self.new_updates.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+            batch = self.updates[:limit]
+
+        self.delivered += len(batch)
+        return batch
+
+    async def api_sendMessage(self, params):
+        chat_id = int(params["chat_id"])
+        message = self.message(chat_id, params.get("text", ""))
+        self.remember_buttons(chat_id, message["message_id"], params)
+        return message
+
+    async def api_editMessageText(self, params):
+        chat_id = int(params["chat_id"])
+        message_id = int(params["message_id"])
+        self.remember_buttons(chat_id, message_id, params)
+        return self.message(chat_id, params.get("text", ""), message_id)
+
+    async def api_editMessageReplyMarkup(self, params):
+        chat_id = int(params["chat_id"])
+        message_id = int(params["message_id"])
+        self.remember_buttons(chat_id, message_id, params)
+        return self.message(chat_id, "", message_id)
+
+    async def api_answerCallbackQuery(self, params):
+        chat_id = self.callback_chats.pop(params["callback_query_id"], None)
+        if chat_id is not None:
+            self.replies[chat_id].set()
+        return True
+
+    # --- Синтетические обновления ---
+
+    async def push(self, update):
+        """Добавление обновления в очередь getUpdates"""
+        async with self.new_updates:
+            update["update_id"] = self.next_update_id
+            self.next_update_id += 1
+            self.updates.append(update)
+            self.new_updates.notify_all()
+
+    def user(self, user_id):
+        return {"id": user_id, "is_bot": False, "first_name": f"User{user_id}"}
+
+    async def send_text(self, user_id, text):
+        """Сообщение пользователя боту"""
+        message = self.message(user_id, text, sender=self.user(user_id))
+        await self.push({"message": message})
+
+    async def tap(self, user_id, prefix):
+        """Нажатие случайной inline-кнопки с данными, начинающимися с prefix; False, если такой нет"""
+        options = [
+            (message_id, data)
+            for message_id, callbacks in self.buttons[user_id].items()
+            for data in callbacks
+            if data.startswith(prefix)
+        ]
+        if not options:
+            return False
+
+        message_id, data = random.choice(options)
+        query_id = f"{user_id}:{self.next_update_id}"
+        self.callback_chats[query_id] = user_id
+        await self.push({
+            "callback_query": {
+                "id": query_id,
+                "from": self.user(user_id),
+                "chat_instance": str(user_id),
+                "data": data,
+                "message": self.message(user_id, "", message_id),
+            }
+        })
+        return True
+
+class LoadStats:
+    """Результаты нагрузки: задержки ответа бота на действия пользователей"""
+
+    def __init__(self):
+        self.latencies = []
+        self.timeouts = 0
+        self.started = time.perf_counter()
+
+    def report(self, api):
+        elapsed = time.perf_counter() - self.started
+        ordered = sorted(self.latencies)
+
+        def percentile(p):
+            return ordered[min(int(len(ordered) * p), len(ordered) - 1)] * 1000 if ordered else 0.0
+
+        lines = [
+            f"⏱ {len(ordered)} действий за {elapsed:.1f} с: {len(ordered) / elapsed:.0f} обновлений/сек",
+            f"   задержка ответа p50 {percentile(0.5):.1f} мс, p95 {percentile(0.95):.1f} мс, "
+            f"p99 {percentile(0.99):.1f} мс, без ответа: {self.timeouts}",
+            f"📨 Выдано getUpdates: {api.delivered}, вызовы API: {dict(api.calls)}",
+            f"🚦 Ответы 429: {dict(api.flood_errors)}",
+        ]
+        return "\n".join(lines)
+
+async def run_user(api, stats, user_id, rounds, think_time, reply_timeout):
+    """Один синтетический пользователь: /start и rounds случайных сценариев"""
+    steps = [("text", "/start")]
+    for n in range(rounds):
+        scenario = random.choice(list(SCENARIOS.values()))
+        steps.extend((kind, value.format(n=n)) for kind, value in scenario)
+
+    for kind, value in steps:
+        reply = api.replies[user_id]
+        reply.clear()
+        started = time.perf_counter()
+
+        if kind == "text":
+            await api.send_text(user_id, value)
+        elif not await api.tap(user_id, value):
+            continue
+
+        try:
+            await asyncio.wait_for(reply.wait(), reply_timeout)
+            stats.latencies.append(time.perf_counter() - started)
+        except asyncio.TimeoutError:
+            stats.timeouts += 1
+
+        if think_time:
+            await asyncio.sleep(random.uniform(0, think_time * 2))
+
+async def run_load(api, users, rounds=3, think_time=0.0, reply_timeout=10.0, first_user_id=100000):
+    """Параллельный прогон users синтетических пользователей, возвращает LoadStats"""
+    stats = LoadStats()
+    await asyncio.gather(*(
+        run_user(api, stats, first_user_id + i, rounds, think_time, reply_timeout)
+        for i in range(users)
+    ))
+    return stats
+
+async def start_server(api, host="127.0.0.1", port=0):
+    """Запуск сервера, возвращает (runner, базовый URL)"""
+    runner = web.AppRunner(api.app())
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://{host}:{port}"
+
+async def main(args):
+    api = FakeBotAPI(flood=not args.no_flood)
+    runner, url = await start_server(api, args.host, args.port)
+    print(f"🧪 Поддельный Bot API: {url} (BOT_API_URL={url})")
+
+    try:
+        print("⏳ Ожидание первого запроса getUpdates от бота...")
+        await api.polling.wait()
+        stats = await run_load(api, args.users, args.rounds, args.think, args.reply_timeout)
+        print(stats.report(api))
+    finally:
+        await runner.cleanup()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--users", type=int, default=1000, help="число синтетических пользователей")
+    parser.add_argument("--rounds", type=int, default=3, help="сценариев на пользователя")
+    parser.add_argument("--think", type=float, default=0.5, help="средняя пауза между действиями (сек)")
+    parser.add_argument("--reply-timeout", type=float, default=10.0, help="ожидание ответа бота (сек)")
+    parser.add_argument("--no-flood", action="store_true", help="отключить лимиты 429")
+    asyncio.run(main(parser.parse_args()))
\ No newline at end of file
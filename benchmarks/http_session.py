@@ -0,0 +1,88 @@
+"""Сравнение стандартной и настроенной HTTP-сессии на локальном Bot API.
+
+Поднимает минимальный сервер, отвечающий на sendMessage, и отправляет
+пачки сообщений с заданным параллелизмом через AiohttpSession и TunedAiohttpSession.
+
+Запуск из корня проекта:
+    python benchmarks/http_session.py [сообщений] [параллелизм]
+"""
+import asyncio
+import os
+import sys
+import time
+
+from aiohttp import web
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+
+from http_session import TunedAiohttpSession
+
+TOKEN = "42:BENCHMARK"
+
+async def handle_method(request):
+    """Ответ в формате Bot API на любой метод (достаточно для sendMessage)"""
+    payload = await request.post()
+    return web.json_response({
+        "ok": True,
+        "result": {
+            "message_id": 1,
+            "date": int(time.time()),
+            "chat": {"id": int(payload.get("chat_id", 0)), "type": "private"},
+            "text": payload.get("text", ""),
+        },
+    })
+
+async def start_server():
+    """Локальный сервер Bot API на свободном порту"""
+    app = web.Application()
+    app.router.add_post("/bot{token}/{method}", handle_method)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, TelegramAPIServer.from_base(f"http://127.0.0.1:{port}")
+
+async def run(session, total, concurrency):
+    """Отправка total сообщений не более чем concurrency параллельно: сообщений в секунду"""
+    bot = Bot(token=TOKEN, session=session)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def send(i):
+        async with semaphore:
+            await bot.send_message(chat_id=i % 100 + 1, text=f"Задача {i}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(send(i) for i in range(total)))
+    elapsed = time.perf_counter() - started
+    await bot.session.close()
+    return total / elapsed
+
+async def main(total, concurrency):
+    runner, server = await start_server()
+    try:
+        default_rate = await run(AiohttpSession(api=server), total, concurrency)
+        print(f"AiohttpSession:       {default_rate:8.0f} сообщ./сек")
+
+        tuned = TunedAiohttpSession(api=server, limit=concurrency)
+        tuned_rate = await run(tuned, total, concurrency)
+        stats = tuned.stats.snapshot()
+        print(f"TunedAiohttpSession:  {tuned_rate:8.0f} сообщ./сек")
+        print(
+            f"\n🔌 Соединений создано: {stats['connections_created']}, "
+            f"переиспользовано: {stats['connections_reused']} ({stats['reuse_ratio']:.1%})"
+        )
+        for method, values in stats["methods"].items():
+            print(f"    {method}: avg {values['avg_ms']:.2f} мс, p95 {values['p95_ms']:.2f} мс, max {values['max_ms']:.2f} мс")
+    finally:
+        await runner.cleanup()
+
+if __name__ == "__main__":
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    asyncio.run(main(total, concurrency))
\ No newline at end of file
@@ -0,0 +1,65 @@
+"""Профиль времени импорта (-X importtime) и холодного/тёплого старта БД.
+
+Запуск из корня проекта:
+    python benchmarks/import_time.py
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES = ["config", "db_handler", "reminders", "bot"]
+
+def import_profile(module):
+    """Импорт модуля в отдельном процессе: (общее время мкс, самые тяжёлые модули)"""
+    env = dict(os.environ)
+    # Импорт не должен требовать токен
+    env.pop("BOT_TOKEN", None)
+    env["PYTHONDONTWRITEBYTECODE"] = "1"
+
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line.split("|")
+        rows.append((int(cumulative_us), name.strip()))
+
+    total = next(us for us, name in reversed(rows) if name == module)
+    heaviest = sorted(rows, reverse=True)[:5]
+    return total, heaviest
+
+def db_start_times():
+    """Время connect() на новой базе (DDL) и на уже созданной (проверка версии)"""
+    sys.path.insert(0, ROOT)
+    from db_handler import Database
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        timings = []
+        for _ in range(2):
+            database = Database(path)
+            started = time.perf_counter()
+            database.connect()
+            timings.append((time.perf_counter() - started) * 1000)
+            database.close()
+    return timings
+
+if __name__ == "__main__":
+    print("⏱ Время импорта модулей (-X importtime):")
+    for module in MODULES:
+        total, heaviest = import_profile(module)
+        print(f"\n{module}: {total / 1000:.1f} мс")
+        for us, name in heaviest:
+            print(f"    {us / 1000:8.1f} мс  {name}")
+
+    cold, warm = db_start_times()
+    print(f"\n🗄 db.connect(): новая база {cold:.2f} мс, существующая {warm:.2f} мс")
\ No newline at end of file
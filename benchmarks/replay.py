@@ -0,0 +1,147 @@
+"""Воспроизведение записанных обновлений для регрессионных тестов производительности.
+
+Журнал пишет UpdateRecorder (UPDATE_LOG_PATH). Обновления подаются в dp.feed_update
+на копии базы с исходными интервалами или ускоренно, ответы бота принимает
+локальный Bot API из fake_bot_api.py. Итог — распределение задержек по обработчикам.
+
+С тем же UPDATE_LOG_SECRET, что и при записи, user_id в копии базы заменяются
+теми же псевдонимами, и задачи из журнала находят своих владельцев.
+
+Запуск из корня проекта:
+    python benchmarks/replay.py updates.jsonl.gz --db tasks.db --speed 10
+    python benchmarks/replay.py updates.jsonl.gz --speed 0    # без пауз, максимально быстро
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fake_bot_api import FakeBotAPI, start_server
+from recorder import anonymize_id, read_log
+
+def copy_database(source, target, secret=None):
+    """Копия базы через backup API; с секретом user_id заменяются псевдонимами"""
+    src = sqlite3.connect(source)
+    dst = sqlite3.connect(target)
+    src.backup(dst)
+    src.close()
+
+    if secret:
+        dst.create_function("anonymize_id", 1, lambda value: anonymize_id(value, secret), deterministic=True)
+        tables = [row[0] for row in dst.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+        for table in tables:
+            columns = [row[1] for row in dst.execute(f"PRAGMA table_info({table})")]
+            if "user_id" in columns:
+                dst.execute(f"UPDATE {table} SET user_id = anonymize_id(user_id)")
+        # Владелец в полнотекстовом индексе — токен 'u' || user_id; триггеры на смену user_id
+        # его не обновляют, поэтому индекс пересобирается (contentless: delete-all и вставка заново)
+        if "tasks_fts" in tables:
+            dst.execute("INSERT INTO tasks_fts (tasks_fts) VALUES ('delete-all')")
+            dst.execute("""
+                INSERT INTO tasks_fts (rowid, text, owner)
+                SELECT id, replace(replace(text, 'ё', 'е'), 'Ё', 'Е'), 'u' || user_id FROM tasks
+            """)
+        dst.commit()
+    dst.close()
+
+class HandlerProbe:
+    """Inner middleware: имя обработчика, который получил обновление"""
+
+    async def __call__(self, handler, event, data):
+        probe = data.get("probe")
+        if probe is not None:
+            probe["handler"] = data["handler"].callback.__name__
+        return await handler(event, data)
+
+def percentile(ordered, p):
+    return ordered[min(int(len(ordered) * p), len(ordered) - 1)] * 1000
+
+def report(latencies, elapsed):
+    """Таблица задержек по обработчикам, самые затратные сверху"""
+    total = sum(len(values) for values in latencies.values())
+    print(f"\n⏱ {total} обновлений за {elapsed:.1f} с ({total / elapsed:.0f}/сек)\n")
+    print(f"{'обработчик':<32}{'кол-во':>8}{'p50 мс':>10}{'p95 мс':>10}{'p99 мс':>10}{'max мс':>10}")
+
+    for name, values in sorted(latencies.items(), key=lambda item: -sum(item[1])):
+        ordered = sorted(values)
+        print(
+            f"{name:<32}{len(ordered):>8}{percentile(ordered, 0.5):>10.1f}{percentile(ordered, 0.95):>10.1f}"
+            f"{percentile(ordered, 0.99):>10.1f}{ordered[-1] * 1000:>10.1f}"
+        )
+
+async def replay(args, db_path):
+    from aiogram import Bot
+    from aiogram.client.telegram import TelegramAPIServer
+    from aiogram.types import Update
+
+    import bot as app
+    from db_handler import db
+    from http_session import create_bot_session
+
+    db.connect(db_path)
+    probe = HandlerProbe()
+    app.dp.message.middleware(probe)
+    app.dp.callback_query.middleware(probe)
+    if args.no_throttle:
+        app.throttling.budgets = {name: (1e9, 1e9) for name in app.throttling.budgets}
+
+    api = FakeBotAPI(flood=False)
+    runner, url = await start_server(api)
+    bot = Bot(token="42:REPLAY", session=create_bot_session(api=TelegramAPIServer.from_base(url)))
+    latencies = defaultdict(list)
+
+    async def feed(update):
+        data = {}
+        started = time.perf_counter()
+        await app.dp.feed_update(bot, update, probe=data)
+        latencies[data.get("handler", "(не обработано)")].append(time.perf_counter() - started)
+
+    tasks = []
+    first_ts = None
+    started = time.perf_counter()
+    try:
+        for record in read_log(args.log):
+            if first_ts is None:
+                first_ts = record["ts"]
+
+            if args.speed:
+                delay = (record["ts"] - first_ts) / args.speed - (time.perf_counter() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+            update = Update.model_validate(record["update"], context={"bot": bot})
+            tasks.append(asyncio.create_task(feed(update)))
+
+        await asyncio.gather(*tasks)
+        report(latencies, time.perf_counter() - started)
+    finally:
+        await bot.session.close()
+        await runner.cleanup()
+        db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("log", help="журнал обновлений (.jsonl.gz)")
+    parser.add_argument("--db", default=os.path.join(ROOT, "tasks.db"), help="исходная база (копируется)")
+    parser.add_argument("--speed", type=float, default=1.0, help="ускорение; 0 — без пауз")
+    parser.add_argument("--secret", default=os.getenv("UPDATE_LOG_SECRET"), help="секрет псевдонимов записи")
+    parser.add_argument("--no-throttle", action="store_true", help="отключить ограничение частоты запросов")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+    secret = args.secret.encode() if args.secret else None
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "replay.db")
+        copy_database(args.db, db_path, secret)
+        # Запись при воспроизведении не нужна
+        os.environ.pop("UPDATE_LOG_PATH", None)
+        os.environ["DB_PATH"] = db_path
+        asyncio.run(replay(args, db_path))
\ No newline at end of file
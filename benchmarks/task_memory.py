@@ -0,0 +1,85 @@
+"""Память и время чтения задач пользователя со 100 тыс. задач.
+
+Сравнивает прежнее чтение (sqlite3.Row, SELECT *, fetchall) со списком Task
+из get_tasks и с потоковым iter_tasks. Пик памяти — по tracemalloc.
+
+Запуск из корня проекта:
+    python benchmarks/task_memory.py [задач]
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from db_handler import Database
+
+USER_ID = 1
+
+def fill(database, count):
+    """Задачи одного пользователя: дедлайны, категории и приоритеты как в жизни"""
+    start = datetime(2024, 1, 1, 9, 0)
+    priorities = ["Высокий", "Средний", "Низкий", None]
+    rows = [
+        (USER_ID, f"Задача номер {n} с обычным по длине текстом",
+         (start + timedelta(hours=n)).isoformat() if n % 3 else None,
+         f"Категория {n % 12}", priorities[n % 4], "Нет")
+        for n in range(count)
+    ]
+    database.conn.executemany("""
+        INSERT INTO tasks (user_id, text, deadline, category, priority, repeat) VALUES (?, ?, ?, ?, ?, ?)
+    """, rows)
+    database.conn.commit()
+
+def measure(name, read):
+    """Время чтения и пик памяти (отдельным прогоном: tracemalloc сильно замедляет)"""
+    started = time.perf_counter()
+    count = read()
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    read()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<38} {count:>7} задач  {elapsed * 1000:8.1f} мс  пик {peak / 1024 / 1024:7.1f} МБ")
+
+def read_rows(path):
+    """Прежний путь: sqlite3.Row, все столбцы, список всех строк"""
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    try:
+        rows = conn.execute("SELECT * FROM tasks WHERE user_id = ? AND done = 0", (USER_ID,)).fetchall()
+        # Обработчики разбирали дедлайн каждой строки при отрисовке
+        for row in rows:
+            if row['deadline']:
+                datetime.fromisoformat(row['deadline'])
+        return len(rows)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        database = Database(path)
+        database.connect()
+        fill(database, count)
+        print(f"🗄 Задач у пользователя: {count}\n")
+
+        measure("sqlite3.Row, SELECT *, fetchall", lambda: read_rows(path))
+        measure("Task, get_tasks (список)", lambda: len(database.get_tasks(USER_ID)))
+        measure("Task, iter_tasks (поток)", lambda: sum(1 for _ in database.iter_tasks(USER_ID)))
+
+        tasks = database.get_tasks(USER_ID)
+        rows = sqlite3.connect(path)
+        rows.row_factory = sqlite3.Row
+        row = rows.execute("SELECT * FROM tasks LIMIT 1").fetchone()
+        print(f"\nРазмер объекта строки: sqlite3.Row {sys.getsizeof(row)} Б, Task {sys.getsizeof(tasks[0])} Б")
+        rows.close()
+        database.close()
\ No newline at end of file
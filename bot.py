@@ -1,48 +1,140 @@
 import asyncio
 import logging
-from datetime import datetime
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
 
 from aiogram import Bot, Dispatcher, F
-from aiogram.types import Message, CallbackQuery
-from aiogram.filters import Command, CommandStart
+from aiogram.types import (
+    Message,
+    CallbackQuery,
+    BufferedInputFile,
+    InlineQuery,
+    InlineQueryResultArticle,
+    InlineQueryResultsButton,
+    InputTextMessageContent,
+)
+from aiogram.filters import Command, CommandObject, CommandStart, StateFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
-from aiogram.utils.keyboard import InlineKeyboardBuilder, ReplyKeyboardBuilder
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.utils.keyboard import ReplyKeyboardBuilder
 
-from config import TOKEN
+from config import (
+    require_token,
+    USER_QUEUE_DEPTH,
+    THROTTLE_BUDGETS,
+    UPDATE_LOG_PATH,
+    UPDATE_LOG_SECRET,
+    HEALTH_PORT,
+    CALENDAR_BASE_URL,
+    TRACE_PATH,
+    TRACE_SAMPLE_RATE,
+    TRACE_SLOW_MS,
+    ADMIN_IDS,
+    QUICK_ADD_MAX_TASKS,
+    INLINE_CACHE_TIME,
+    INLINE_RESULTS_TTL,
+    INLINE_CACHE_SIZE,
+)
 from db_handler import db
 from states import TaskStates
 from Keyboards import (
     main_menu_keyboard,
     task_actions_keyboard,
+    confirm_delete_keyboard,
+    edit_fields_keyboard,
+    edit_options_keyboard,
+    edit_back_keyboard,
+    PRIORITY_OPTIONS,
+    REPEAT_OPTIONS,
     priority_keyboard,
     repeat_keyboard,
-    edit_choice_keyboard,
     cancel_keyboard,
     categories_keyboard,
+    category_page_keyboard,
+    CATEGORY_PAGE_SIZE,
     back_to_menu_keyboard,
     filter_keyboard,
     deadline_keyboard
 )
 from reminders import reminder_loop
-
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.FileHandler("bot.log", encoding="utf-8"),
-        logging.StreamHandler()
-    ]
+from archiver import archive_loop
+from backup import backup_loop
+from maintenance import maintenance_loop
+from health import loop_monitor, create_app, start_server
+from tracing import (
+    Tracer,
+    TracingMiddleware,
+    HandlerTracingMiddleware,
+    RequestTracingMiddleware,
+    instrument_database,
 )
+from middlewares import UserQueueMiddleware, ThrottlingMiddleware
+from http_session import create_bot_session
+from recorder import UpdateRecorder, keyboard_texts
+from profiler import profile_loop, memory_diff
+from quickadd import parse_message
+from calendar_feed import start_calendar_server, feed_url, feed_stats
+
 logger = logging.getLogger(__name__)
 
-# Инициализация бота и диспетчера
-bot = Bot(token=TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+# Инициализация диспетчера (бот создаётся в main(), чтобы импорт не требовал токена)
 storage = MemoryStorage()
 dp = Dispatcher(storage=storage)
+health_runner = None  # HTTP-сервер /healthz и /readyz, запускается вместе с опросом
+calendar_runner = None  # Публичный HTTP-сервер ленты календаря (только при заданном CALENDAR_BASE_URL)
+
+# Необязательная запись обновлений — первой, чтобы время получения не включало ожидание в очереди
+recorder = None
+if UPDATE_LOG_PATH:
+    recorder = UpdateRecorder(
+        UPDATE_LOG_PATH,
+        secret=UPDATE_LOG_SECRET,
+        known_texts=keyboard_texts(
+            main_menu_keyboard(), filter_keyboard(), deadline_keyboard(), cancel_keyboard(),
+            priority_keyboard(), repeat_keyboard(), back_to_menu_keyboard(),
+            categories_keyboard([])
+        )
+    )
+
+# Обновления одного пользователя обрабатываются строго по порядку.
+# Очередь должна стоять до FSM-middleware, иначе состояние читается ещё до ожидания
+user_queue = UserQueueMiddleware(max_depth=USER_QUEUE_DEPTH)
+dp.update.outer_middleware.unregister(dp.fsm)
+if recorder:
+    dp.update.outer_middleware(recorder)
+
+# Необязательная трассировка: корневой span охватывает и ожидание в очереди пользователя
+tracer = None
+if TRACE_PATH:
+    tracer = Tracer(TRACE_PATH, sample_rate=TRACE_SAMPLE_RATE, slow_ms=TRACE_SLOW_MS)
+    dp.update.outer_middleware(TracingMiddleware(tracer))
+    instrument_database(db, tracer)
+
+dp.update.outer_middleware(user_queue)
+dp.update.outer_middleware(dp.fsm)
+
+# Ограничение частоты запросов; тяжёлые обработчики помечены флагом throttling="heavy"
+throttling = ThrottlingMiddleware(THROTTLE_BUDGETS)
+dp.message.middleware(throttling)
+dp.callback_query.middleware(throttling)
+if tracer:
+    dp.message.middleware(HandlerTracingMiddleware(tracer))
+    dp.callback_query.middleware(HandlerTracingMiddleware(tracer))
+
+def setup_logging():
+    """Настройка логирования"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+        handlers=[
+            logging.FileHandler("bot.log", encoding="utf-8"),
+            logging.StreamHandler()
+        ]
+    )
 
 # ==================== КОМАНДЫ ====================
 
@@ -73,7 +165,14 @@ async def command_help(message: Message):
         "/start - Перезапустить бота\n"
         "/help - Эта справка\n"
         "/stats - Статистика задач\n"
-        "/search <текст> - Поиск задач\n\n"
+        "/search <текст> - Поиск задач\n"
+        "/add <задача> - Быстрое добавление\n"
+        "/calendar - Ссылка на календарь с дедлайнами\n\n"
+        
+        "<b>Быстрое добавление:</b>\n"
+        "<code>/add купить молоко #дом !высокий @2024-12-31 18:00 ~ежедневно</code>\n"
+        "#категория, !приоритет (высокий/средний/низкий), @дата [время], ~повторение — всё необязательно. "
+        "Каждая строка сообщения — отдельная задача\n\n"
         
         "<b>Управление задачами:</b>\n"
         "• Используйте кнопку '➕ Создать задачу' для добавления\n"
@@ -90,12 +189,12 @@ async def command_help(message: Message):
     
     await message.answer(help_text, reply_markup=main_menu_keyboard())
 
-@dp.message(Command("stats"))
+@dp.message(Command("stats"), flags={"throttling": "heavy"})
 async def command_stats(message: Message):
     """Обработка команды /stats"""
     await show_stats(message)
 
-@dp.message(Command("search"))
+@dp.message(Command("search"), flags={"throttling": "heavy"})
 async def command_search(message: Message, state: FSMContext):
     """Обработка команды /search"""
     args = message.text.split(maxsplit=1)
@@ -196,14 +295,14 @@ async def process_deadline(message: Message, state: FSMContext):
     
     await state.update_data(deadline=deadline)
     
-    # Получаем категории пользователя
-    categories = db.get_user_categories(message.from_user.id)
+    # Самые используемые категории; лишняя строка показывает, есть ли ещё
+    categories = db.get_user_categories(message.from_user.id, limit=CATEGORY_PAGE_SIZE + 1)
     
     if categories:
         await message.answer(
             "🏷️ <b>Выберите категорию</b>\n\n"
             "Выберите из существующих или создайте новую:",
-            reply_markup=categories_keyboard(categories)
+            reply_markup=categories_keyboard(categories, more=len(categories) > CATEGORY_PAGE_SIZE)
         )
     else:
         await message.answer(
@@ -222,10 +321,21 @@ async def process_category(message: Message, state: FSMContext):
         await message.answer("❌ Создание задачи отменено", reply_markup=main_menu_keyboard())
         return
     
+    if message.text == "📂 Другие категории":
+        await message.answer(
+            "🏷️ <b>Другие категории</b>",
+            reply_markup=category_page(message.from_user.id, CATEGORY_PAGE_SIZE)
+        )
+        return
+    
     category = None
     if message.text != "❌ Без категории" and message.text != "➕ Новая категория":
         category = message.text.strip()
     
+    await choose_category(message, state, category)
+
+async def choose_category(message: Message, state: FSMContext, category):
+    """Сохранение категории новой задачи и переход к приоритету"""
     await state.update_data(category=category)
     
     await message.answer(
@@ -234,6 +344,69 @@ async def process_category(message: Message, state: FSMContext):
     )
     await state.set_state(TaskStates.waiting_for_priority)
 
+# Предел callback_data в Telegram (байт)
+CALLBACK_DATA_LIMIT = 64
+
+def category_callback(user_id, name):
+    """callback_data кнопки категории: само имя, а если не помещается — постоянный ключ.
+    
+    Позиция в списке не годится: порядок по использованию меняется между показом и нажатием.
+    """
+    data = f"catname_{name}"
+    if len(data.encode("utf-8")) <= CALLBACK_DATA_LIMIT:
+        return data
+    return f"catkey_{db.get_category_key(user_id, name)}"
+
+def category_page(user_id, offset, back_data=None):
+    """Страница категорий пользователя для inline-выбора"""
+    categories = db.get_user_categories(user_id, limit=CATEGORY_PAGE_SIZE + 1, offset=offset)
+    return category_page_keyboard(
+        [(name, category_callback(user_id, name)) for name in categories[:CATEGORY_PAGE_SIZE]],
+        offset,
+        more=len(categories) > CATEGORY_PAGE_SIZE,
+        back_data=back_data
+    )
+
+@dp.callback_query(
+    StateFilter(TaskStates.waiting_for_category, TaskStates.waiting_for_edit_category),
+    F.data.startswith("catpage_")
+)
+async def callback_category_page(callback: CallbackQuery, state: FSMContext):
+    """Листание страниц категорий"""
+    offset = int(callback.data.split("_")[1])
+    data = await state.get_data()
+    back_data = f"editback_{data['edit_task_id']}" if data.get("edit_task_id") else None
+    
+    await edit_callback_card(callback, reply_markup=category_page(callback.from_user.id, offset, back_data))
+    await callback.answer()
+
+@dp.callback_query(
+    StateFilter(TaskStates.waiting_for_category, TaskStates.waiting_for_edit_category),
+    F.data.startswith("catname_") | F.data.startswith("catkey_")
+)
+async def callback_category_pick(callback: CallbackQuery, state: FSMContext):
+    """Выбор категории со страницы"""
+    kind, value = callback.data.split("_", 1)
+    # Категория могла перестать использоваться, пока страница была на экране
+    if kind == "catname":
+        picked = db.find_category(callback.from_user.id, name=value)
+    else:
+        picked = db.find_category(callback.from_user.id, key=int(value)) if value.isdigit() else None
+    if not picked:
+        await callback.answer("❌ Категория не найдена", show_alert=True)
+        return
+    
+    await callback.answer(f"🏷️ {picked}")
+    
+    if await state.get_state() == TaskStates.waiting_for_category:
+        await edit_callback_card(callback, reply_markup=None)
+        await choose_category(callback.message, state, picked)
+        return
+    
+    data = await state.get_data()
+    task = db.update_task(data.get("edit_task_id"), callback.from_user.id, category=picked)
+    await finish_edit(callback.message, state, task, "✅ Категория обновлена")
+
 @dp.message(TaskStates.waiting_for_priority)
 async def process_priority(message: Message, state: FSMContext):
     """Обработка приоритета"""
@@ -307,6 +480,80 @@ async def process_repeat_and_save(message: Message, state: FSMContext):
     
     await state.clear()
 
+@dp.message(Command("calendar"))
+async def command_calendar(message: Message):
+    """Обработка команды /calendar: ссылка на ленту iCalendar"""
+    if not CALENDAR_BASE_URL:
+        await message.answer("📅 Календарь сейчас недоступен.", reply_markup=main_menu_keyboard())
+        return
+    
+    await message.answer(
+        "📅 <b>Календарь дедлайнов</b>\n\n"
+        "Добавьте ссылку в календарь как подписку (iCalendar):\n"
+        f"<code>{feed_url(message.from_user.id)}</code>\n\n"
+        "Не передавайте ссылку другим: по ней видны ваши задачи.",
+        reply_markup=main_menu_keyboard()
+    )
+
+# ==================== БЫСТРОЕ ДОБАВЛЕНИЕ ====================
+
+@dp.message(Command("add"))
+async def command_add(message: Message, command: CommandObject):
+    """Обработка команды /add: задачи одним сообщением"""
+    if not command.args:
+        await message.answer(
+            "⚡ <b>Быстрое добавление</b>\n\n"
+            "<code>/add купить молоко #дом !высокий @2024-12-31 18:00 ~ежедневно</code>\n\n"
+            "Каждая строка после /add — отдельная задача.",
+            reply_markup=main_menu_keyboard()
+        )
+        return
+    
+    await quick_add(message, command.args)
+
+def format_quick_task(task):
+    """Краткая строка о созданной задаче"""
+    details = []
+    if task["deadline"]:
+        details.append(f"⏰ {datetime.fromisoformat(task['deadline']).strftime('%d.%m.%Y %H:%M')}")
+    if task["category"]:
+        details.append(f"🏷️ {task['category']}")
+    if task["priority"]:
+        details.append(f"⚡ {task['priority']}")
+    if task["repeat"] != "Нет":
+        details.append(f"🔄 {task['repeat']}")
+    return f"• <b>{task['text']}</b>" + (f" ({', '.join(details)})" if details else "")
+
+async def quick_add(message: Message, text):
+    """Разбор сообщения и создание всех задач одной вставкой"""
+    tasks, errors = parse_message(text)
+    
+    if len(tasks) > QUICK_ADD_MAX_TASKS:
+        await message.answer(
+            f"❌ Слишком много задач в одном сообщении: {len(tasks)} (максимум {QUICK_ADD_MAX_TASKS})",
+            reply_markup=main_menu_keyboard()
+        )
+        return
+    
+    task_ids = db.add_tasks(message.from_user.id, tasks)
+    if tasks and not task_ids:
+        await message.answer(
+            "❌ <b>Ошибка при создании задач!</b>\n\n"
+            "Попробуйте ещё раз.",
+            reply_markup=main_menu_keyboard()
+        )
+        return
+    
+    lines = []
+    if task_ids:
+        lines.append(f"📝 <b>Создано задач: {len(task_ids)}</b>\n")
+        lines += [format_quick_task(task) for task in tasks]
+    if errors:
+        lines.append("\n⚠️ <b>Не распознаны строки:</b>")
+        lines += [f"{number}. {line} — {error}" for number, line, error in errors]
+    
+    await message.answer("\n".join(lines), reply_markup=main_menu_keyboard())
+
 # ==================== ПОКАЗ ЗАДАЧ ====================
 
 @dp.message(F.text == "📋 Мои задачи")
@@ -318,53 +565,91 @@ async def show_tasks_menu(message: Message):
         reply_markup=filter_keyboard()
     )
 
-@dp.message(F.text == "📋 Все задачи")
+@dp.message(F.text == "📋 Все задачи", flags={"throttling": "heavy"})
 async def show_all_tasks(message: Message):
     """Показ всех задач"""
-    user_id = message.from_user.id
-    logger.info(f"📋 Запрошены задачи для пользователя {user_id}")
-    
-    tasks = db.get_tasks(user_id, show_completed=True)
-    logger.info(f"📋 Получено задач из БД: {len(tasks)}")
-    
-    for task in tasks:
-        logger.info(f"Задача: ID={task['id']}, текст={task['text']}, выполнена={task['done']}")
-    
-    await display_tasks(message, tasks, "Все задачи")
+    logger.info(f"📋 Запрошены задачи для пользователя {message.from_user.id}")
+    await display_tasks(message, "Все задачи", show_completed=True)
 
-@dp.message(F.text == "✅ Выполненные")
+@dp.message(F.text == "✅ Выполненные", flags={"throttling": "heavy"})
 async def show_completed_tasks(message: Message):
     """Показ выполненных задач"""
-    # Для простоты покажем все задачи и отфильтруем на стороне Python
-    tasks = db.get_tasks(message.from_user.id, show_completed=True)
-    completed_tasks = [task for task in tasks if task['done'] == 1]
-    await display_tasks(message, completed_tasks, "Выполненные задачи")
+    await display_tasks(message, "Выполненные задачи", only_completed=True, include_archive=True)
 
-@dp.message(F.text == "❌ Невыполненные")
+@dp.message(F.text == "❌ Невыполненные", flags={"throttling": "heavy"})
 async def show_incomplete_tasks(message: Message):
     """Показ невыполненных задач"""
-    tasks = db.get_tasks(message.from_user.id, show_completed=False)
-    await display_tasks(message, tasks, "Невыполненные задачи")
+    await display_tasks(message, "Невыполненные задачи")
 
-@dp.message(F.text == "🔴 Высокий приоритет")
+@dp.message(F.text == "🔴 Высокий приоритет", flags={"throttling": "heavy"})
 async def show_high_priority_tasks(message: Message):
     """Показ задач с высоким приоритетом"""
-    tasks = db.get_tasks(message.from_user.id, show_completed=False)
-    high_tasks = [task for task in tasks if task['priority'] == 'Высокий']
-    await display_tasks(message, high_tasks, "Задачи с высоким приоритетом")
+    await display_tasks(message, "Задачи с высоким приоритетом", priority="Высокий")
 
-@dp.message(F.text == "⏰ С дедлайном")
+@dp.message(F.text == "⏰ С дедлайном", flags={"throttling": "heavy"})
 async def show_tasks_with_deadline(message: Message):
     """Показ задач с дедлайном"""
-    tasks = db.get_tasks(message.from_user.id, show_completed=False)
-    tasks_with_deadline = [task for task in tasks if task['deadline']]
-    await display_tasks(message, tasks_with_deadline, "Задачи с дедлайном")
+    await display_tasks(message, "Задачи с дедлайном", with_deadline=True)
+
+# Дни недели для заголовков повестки
+WEEKDAYS = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"]
+AGENDA_LIMIT = 100
+
+@dp.message(F.text == "📅 Сегодня")
+async def show_today(message: Message):
+    """Задачи с дедлайном сегодня"""
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    await display_agenda(message, "Сегодня", today, today + timedelta(days=1))
+
+@dp.message(F.text == "🗓 Эта неделя")
+async def show_week(message: Message):
+    """Задачи с дедлайном в ближайшие 7 дней"""
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    await display_agenda(message, "Эта неделя", today, today + timedelta(days=7))
+
+@dp.message(F.text == "⚠️ Просрочено")
+async def show_overdue(message: Message):
+    """Задачи с прошедшим дедлайном: открытые и закрытые напоминанием без подтверждения"""
+    await display_agenda(message, "Просрочено", None, datetime.now(), auto_closed=True)
 
-async def display_tasks(message: Message, tasks, title):
-    """Отображение списка задач"""
-    logger.info(f"📋 Отображение задач: {title}, количество: {len(tasks)}")
+async def display_agenda(message: Message, title, start, end, auto_closed=False):
+    """Повестка одним сообщением: задачи сгруппированы по дням"""
+    tasks = db.get_agenda(message.from_user.id, start, end, limit=AGENDA_LIMIT + 1, auto_closed=auto_closed)
     
     if not tasks:
+        await message.answer(f"📭 <b>{title}</b>\n\nЗадач нет.", reply_markup=filter_keyboard())
+        return
+    
+    now = datetime.now()
+    lines = [f"📋 <b>{title}</b>"]
+    current_day = None
+    
+    for task in tasks[:AGENDA_LIMIT]:
+        deadline = task.due
+        if deadline.date() != current_day:
+            current_day = deadline.date()
+            lines.append(f"\n<b>{WEEKDAYS[current_day.weekday()]}, {current_day.strftime('%d.%m.%Y')}</b>")
+        
+        icon = PRIORITY_ICONS.get(task.priority, "▫️")
+        late = " ⚠️" if deadline < now else ""
+        closed = " 🔕" if task.auto_closed else ""
+        category = f" 🏷️ {task.category}" if task.category else ""
+        lines.append(f"<code>{deadline.strftime('%H:%M')}</code> {icon} {task.text}{category}{late}{closed}")
+    
+    if len(tasks) > AGENDA_LIMIT:
+        lines.append(f"\n<i>Показаны первые {AGENDA_LIMIT}. Остальные — в «⏰ С дедлайном».</i>")
+    if any(task.auto_closed for task in tasks):
+        lines.append("\n<i>🔕 — закрыта напоминанием по дедлайну. Подтвердите выполнение кнопкой ✅ в карточке задачи.</i>")
+    
+    await message.answer("\n".join(lines), reply_markup=filter_keyboard())
+
+async def display_tasks(message: Message, title, **filters):
+    """Отображение списка задач: число — отдельным запросом, сами задачи читаются потоком"""
+    user_id = message.from_user.id
+    count = db.count_tasks(user_id, **filters)
+    logger.info(f"📋 Отображение задач: {title}, количество: {count}")
+    
+    if not count:
         await message.answer(
             f"📭 <b>{title}</b>\n\n"
             "Задач не найдено.",
@@ -374,44 +659,87 @@ async def display_tasks(message: Message, tasks, title):
     
     await message.answer(
         f"📋 <b>{title}</b>\n\n"
-        f"Найдено задач: {len(tasks)}",
+        f"Найдено задач: {count}",
         reply_markup=main_menu_keyboard()
     )
     
-    for task in tasks:
-        logger.info(f"Отображаю задачу: {task['id']} - {task['text']}")
-        status = "✅" if task['done'] == 1 else "❌"
-        priority_icon = ""
-        
-        if task['priority'] == 'Высокий':
-            priority_icon = "🔴"
-        elif task['priority'] == 'Средний':
-            priority_icon = "🟡"
-        elif task['priority'] == 'Низкий':
-            priority_icon = "🟢"
-        
-        task_text = f"{status} {priority_icon} <b>{task['text']}</b>\n"
-        
-        if task['deadline']:
-            try:
-                deadline_dt = datetime.fromisoformat(task['deadline'])
-                task_text += f"⏰ {deadline_dt.strftime('%d.%m.%Y %H:%M')}\n"
-            except:
-                task_text += f"⏰ {task['deadline']}\n"
-        
-        if task['category']:
-            task_text += f"🏷️ {task['category']}\n"
-        
-        if task['repeat'] and task['repeat'] != 'Нет':
-            task_text += f"🔄 {task['repeat']}\n"
-        
-        task_text += f"<i>ID: {task['id']}</i>"
-        
+    for task in db.iter_tasks(user_id, **filters):
+        logger.info(f"Отображаю задачу: {task.id} - {task.text}")
         await message.answer(
-            task_text,
-            reply_markup=task_actions_keyboard(task['id'])
+            format_task(task),
+            reply_markup=task_actions_keyboard(task.id, done=task.completed)
         )
 
+PRIORITY_ICONS = {"Высокий": "🔴", "Средний": "🟡", "Низкий": "🟢"}
+
+def format_task(task):
+    """Текст карточки задачи"""
+    status = "✅" if task.completed else ("🔕" if task.auto_closed else "❌")
+    priority_icon = PRIORITY_ICONS.get(task.priority, "")
+    
+    # Выполненные задачи зачёркиваем
+    text = f"<s>{task.text}</s>" if task.completed else task.text
+    task_text = f"{status} {priority_icon} <b>{text}</b>\n"
+    
+    if task.due:
+        task_text += f"⏰ {task.due.strftime('%d.%m.%Y %H:%M')}\n"
+    elif task.deadline:
+        task_text += f"⏰ {task.deadline}\n"
+    
+    if task.category:
+        task_text += f"🏷️ {task.category}\n"
+    
+    if task.repeat and task.repeat != 'Нет':
+        task_text += f"🔄 {task.repeat}\n"
+    
+    if task.auto_closed:
+        task_text += "🔕 Закрыта напоминанием по дедлайну — подтвердите выполнение\n"
+    
+    task_text += f"<i>ID: {task.id}</i>"
+    return task_text
+
+# Последнее отправленное состояние карточек: (chat_id, message_id) -> (текст, клавиатура)
+_card_states = OrderedDict()
+_CARD_STATES_LIMIT = 1024
+
+async def edit_card(bot, chat_id, message_id, text=None, reply_markup=None):
+    """Обновление карточки задачи на месте, одинаковые правки не отправляются"""
+    key = (chat_id, message_id)
+    markup_state = reply_markup.model_dump_json() if reply_markup else None
+    new_state = (text, markup_state)
+    
+    if _card_states.get(key) == new_state:
+        return
+    
+    try:
+        if text is not None:
+            await bot.edit_message_text(
+                text, chat_id=chat_id, message_id=message_id, reply_markup=reply_markup
+            )
+        else:
+            await bot.edit_message_reply_markup(
+                chat_id=chat_id, message_id=message_id, reply_markup=reply_markup
+            )
+    except TelegramBadRequest as e:
+        # Карточка уже в нужном состоянии (например, повторное нажатие)
+        if "message is not modified" not in str(e):
+            raise
+    
+    _card_states[key] = new_state
+    _card_states.move_to_end(key)
+    if len(_card_states) > _CARD_STATES_LIMIT:
+        _card_states.popitem(last=False)
+
+async def edit_callback_card(callback: CallbackQuery, text=None, reply_markup=None):
+    """Обновление карточки, на которой нажата кнопка"""
+    await edit_card(
+        callback.bot,
+        callback.message.chat.id,
+        callback.message.message_id,
+        text,
+        reply_markup
+    )
+
 # ==================== CALLBACK ОБРАБОТЧИКИ ====================
 
 @dp.callback_query(F.data.startswith("done_"))
@@ -419,126 +747,169 @@ async def callback_done_task(callback: CallbackQuery):
     """Обработка отметки задачи как выполненной"""
     task_id = int(callback.data.split("_")[1])
     
-    if db.mark_done(task_id):
-        await callback.message.answer("✅ Задача отмечена как выполненная")
-        await callback.answer("Задача выполнена!")
+    # Проверка владельца, изменение и получение задачи — одним запросом
+    task = db.mark_done(task_id, callback.from_user.id)
+    
+    if task:
+        # Повторяющаяся задача остаётся открытой и переносится на следующий срок
+        done = task.completed
+        await edit_callback_card(callback, format_task(task), task_actions_keyboard(task_id, done=done))
+        await callback.answer("Задача выполнена!" if done else "Задача выполнена, следующий срок назначен")
     else:
-        await callback.answer("❌ Ошибка при обновлении задачи", show_alert=True)
+        await callback.answer("❌ Задача не найдена", show_alert=True)
 
 @dp.callback_query(F.data.startswith("delete_"))
 async def callback_delete_task(callback: CallbackQuery):
     """Обработка удаления задачи"""
     task_id = int(callback.data.split("_")[1])
     
-    # Получаем задачу для подтверждения
-    task = db.get_task(task_id)
-    
-    if task and task['user_id'] == callback.from_user.id:
-        # Создаем клавиатуру подтверждения
-        confirm_kb = InlineKeyboardBuilder()
-        confirm_kb.button(text="✅ Да, удалить", callback_data=f"confirm_delete_{task_id}")
-        confirm_kb.button(text="❌ Нет, отменить", callback_data="cancel_delete")
-        
-        await callback.message.answer(
-            f"❌ <b>Подтвердите удаление</b>\n\n"
-            f"Задача: {task['text']}\n\n"
-            "Вы уверены, что хотите удалить эту задачу?",
-            reply_markup=confirm_kb.as_markup()
-        )
-        await callback.answer()
-    else:
-        await callback.answer("❌ Задача не найдена", show_alert=True)
+    # Владелец проверяется при подтверждении, здесь лишь меняем кнопки карточки
+    await edit_callback_card(callback, reply_markup=confirm_delete_keyboard(task_id))
+    await callback.answer("Вы уверены, что хотите удалить эту задачу?")
 
 @dp.callback_query(F.data.startswith("confirm_delete_"))
 async def callback_confirm_delete(callback: CallbackQuery):
     """Подтверждение удаления задачи"""
     task_id = int(callback.data.split("_")[2])
     
-    if db.delete_task(task_id):
-        await callback.message.answer("❌ Задача удалена")
+    task = db.delete_task(task_id, callback.from_user.id)
+    
+    if task:
+        await edit_callback_card(callback, f"🗑 <s>{task.text}</s>\n<i>Задача удалена</i>")
         await callback.answer("Задача удалена!")
     else:
-        await callback.answer("❌ Ошибка при удалении задачи", show_alert=True)
+        await callback.answer("❌ Задача не найдена", show_alert=True)
 
-@dp.callback_query(F.data == "cancel_delete")
+@dp.callback_query(F.data.startswith("cancel_delete"))
 async def callback_cancel_delete(callback: CallbackQuery):
     """Отмена удаления задачи"""
-    await callback.message.answer("✅ Удаление отменено")
-    await callback.answer()
+    parts = callback.data.split("_")
+    
+    if len(parts) < 3:
+        # Старое отдельное сообщение с подтверждением
+        await edit_callback_card(callback, "✅ Удаление отменено")
+        await callback.answer()
+        return
+    
+    await restore_card(callback, int(parts[2]))
+    await callback.answer("Удаление отменено")
 
 @dp.callback_query(F.data.startswith("edit_"))
 async def callback_edit_task(callback: CallbackQuery, state: FSMContext):
     """Начало редактирования задачи"""
     task_id = int(callback.data.split("_")[1])
     
-    # Сохраняем ID задачи в состоянии
-    await state.update_data(edit_task_id=task_id)
-    
-    await callback.message.answer(
-        "✏️ <b>Редактирование задачи</b>\n\n"
-        "Что вы хотите изменить?",
-        reply_markup=edit_choice_keyboard()
-    )
-    
-    await state.set_state(TaskStates.waiting_for_edit_choice)
-    await callback.answer()
+    await state.clear()
+    await edit_callback_card(callback, reply_markup=edit_fields_keyboard(task_id))
+    await callback.answer("Что вы хотите изменить?")
+
+async def restore_card(callback: CallbackQuery, task_id):
+    """Возврат карточки задачи к обычному виду"""
+    task = db.get_task(task_id, callback.from_user.id)
+    
+    if task:
+        await edit_callback_card(
+            callback,
+            format_task(task),
+            task_actions_keyboard(task_id, done=task.completed)
+        )
+    else:
+        await edit_callback_card(callback, "📭 <i>Задача не найдена</i>")
 
 # ==================== РЕДАКТИРОВАНИЕ ЗАДАЧ ====================
 
-@dp.message(TaskStates.waiting_for_edit_choice)
-async def process_edit_choice(message: Message, state: FSMContext):
+# Поля, новое значение которых вводится сообщением
+EDIT_PROMPTS = {
+    "text": (TaskStates.waiting_for_edit_text, "Введите новый текст задачи:"),
+    "deadline": (
+        TaskStates.waiting_for_edit_deadline,
+        "Введите новый дедлайн в формате:\n"
+        "<code>ГГГГ-ММ-ДД ЧЧ:ММ</code>\n"
+        "Или '❌ Без дедлайна'"
+    ),
+    "category": (TaskStates.waiting_for_edit_category, "Выберите категорию или введите новую:"),
+}
+EDIT_STATES = {edit_state.state for edit_state, _ in EDIT_PROMPTS.values()}
+
+@dp.callback_query(F.data.startswith("editfield_"))
+async def callback_edit_field(callback: CallbackQuery, state: FSMContext):
     """Обработка выбора что редактировать"""
-    if message.text == "❌ Отмена":
-        await state.clear()
-        await message.answer("❌ Редактирование отменено", reply_markup=main_menu_keyboard())
-        return
+    _, field, task_id = callback.data.split("_")
+    task_id = int(task_id)
+    
+    if field in EDIT_PROMPTS:
+        edit_state, prompt = EDIT_PROMPTS[field]
+        await state.set_state(edit_state)
+        await state.update_data(edit_task_id=task_id, edit_message_id=callback.message.message_id)
+        if field == "category":
+            keyboard = category_page(callback.from_user.id, 0, back_data=f"editback_{task_id}")
+        else:
+            keyboard = edit_back_keyboard(task_id)
+        await edit_callback_card(
+            callback,
+            f"✏️ <b>Редактирование задачи</b> <i>(ID: {task_id})</i>\n\n{prompt}",
+            keyboard
+        )
+        # Убираем главное меню: его кнопки, нажатые во время ввода, попали бы в задачу как новое значение
+        await callback.message.answer(
+            "⌨️ Отправьте новое значение сообщением или нажмите «❌ Отмена»",
+            reply_markup=deadline_keyboard() if field == "deadline" else cancel_keyboard()
+        )
+    else:
+        await edit_callback_card(callback, reply_markup=edit_options_keyboard(task_id, field))
     
+    await callback.answer()
+
+@dp.callback_query(F.data.startswith("setfield_"))
+async def callback_set_field(callback: CallbackQuery):
+    """Установка приоритета или повторения с карточки задачи"""
+    _, field, task_id, index = callback.data.split("_")
+    task_id, index = int(task_id), int(index)
+    
+    if field == "priority":
+        task = db.update_task(task_id, callback.from_user.id, priority=PRIORITY_OPTIONS[index][1])
+    else:
+        task = db.update_task(task_id, callback.from_user.id, repeat=REPEAT_OPTIONS[index])
+    
+    if task:
+        await edit_callback_card(
+            callback,
+            format_task(task),
+            task_actions_keyboard(task_id, done=task.completed)
+        )
+        await callback.answer("✅ Задача обновлена")
+    else:
+        await callback.answer("❌ Задача не найдена", show_alert=True)
+
+@dp.callback_query(F.data.startswith("editback_"))
+async def callback_edit_back(callback: CallbackQuery, state: FSMContext):
+    """Выход из редактирования на карточке задачи"""
+    editing = await state.get_state() in EDIT_STATES
+    await state.clear()
+    await restore_card(callback, int(callback.data.split("_")[1]))
+    if editing:
+        await callback.message.answer("❌ Редактирование отменено", reply_markup=main_menu_keyboard())
+    await callback.answer()
+
+async def finish_edit(message: Message, state: FSMContext, task, success_text):
+    """Обновление карточки после ввода нового значения"""
     data = await state.get_data()
-    task_id = data.get("edit_task_id")
+    await state.clear()
     
-    if not task_id:
-        await message.answer("❌ Ошибка: задача не найдена", reply_markup=main_menu_keyboard())
-        await state.clear()
+    if not task:
+        await message.answer("❌ Ошибка при обновлении", reply_markup=main_menu_keyboard())
         return
     
-    if message.text == "📝 Текст":
-        await message.answer("Введите новый текст задачи:", reply_markup=cancel_keyboard())
-        await state.set_state(TaskStates.waiting_for_edit_text)
-    
-    elif message.text == "⏰ Дедлайн":
-        await message.answer(
-            "Введите новый дедлайн в формате:\n"
-            "<code>ГГГГ-ММ-ДД ЧЧ:ММ</code>\n"
-            "Или '❌ Без дедлайна'",
-            reply_markup=cancel_keyboard()
+    if data.get("edit_message_id"):
+        await edit_card(
+            message.bot,
+            message.chat.id,
+            data["edit_message_id"],
+            format_task(task),
+            task_actions_keyboard(task.id, done=task.completed)
         )
-        await state.set_state(TaskStates.waiting_for_edit_deadline)
-    
-    elif message.text == "🏷️ Категория":
-        categories = db.get_user_categories(message.from_user.id)
-        
-        if categories:
-            await message.answer(
-                "Выберите категорию:",
-                reply_markup=categories_keyboard(categories)
-            )
-        else:
-            await message.answer("Введите новую категорию:", reply_markup=cancel_keyboard())
-        
-        await state.set_state(TaskStates.waiting_for_edit_category)
-    
-    elif message.text == "⚡ Приоритет":
-        await message.answer("Выберите приоритет:", reply_markup=priority_keyboard())
-        await state.set_state(TaskStates.waiting_for_edit_priority)
-    
-    elif message.text == "🔄 Повторение":
-        await message.answer("Выберите повторение:", reply_markup=repeat_keyboard())
-        # Используем то же состояние, что и для создания
-        await state.set_state(TaskStates.waiting_for_repeat)
-    
-    else:
-        await message.answer("❌ Неверный выбор", reply_markup=main_menu_keyboard())
-        await state.clear()
+    # Возвращаем главное меню вместо клавиатуры отмены
+    await message.answer(success_text, reply_markup=main_menu_keyboard())
 
 @dp.message(TaskStates.waiting_for_edit_text)
 async def process_edit_text(message: Message, state: FSMContext):
@@ -551,12 +922,8 @@ async def process_edit_text(message: Message, state: FSMContext):
     data = await state.get_data()
     task_id = data.get("edit_task_id")
     
-    if db.update_task(task_id, text=message.text):
-        await message.answer("✅ Текст задачи обновлён", reply_markup=main_menu_keyboard())
-    else:
-        await message.answer("❌ Ошибка при обновлении", reply_markup=main_menu_keyboard())
-    
-    await state.clear()
+    task = db.update_task(task_id, message.from_user.id, text=message.text)
+    await finish_edit(message, state, task, "✅ Текст задачи обновлён")
 
 @dp.message(TaskStates.waiting_for_edit_deadline)
 async def process_edit_deadline(message: Message, state: FSMContext):
@@ -579,12 +946,8 @@ async def process_edit_deadline(message: Message, state: FSMContext):
             await state.clear()
             return
     
-    if db.update_task(task_id, deadline=deadline):
-        await message.answer("✅ Дедлайн обновлён", reply_markup=main_menu_keyboard())
-    else:
-        await message.answer("❌ Ошибка при обновлении", reply_markup=main_menu_keyboard())
-    
-    await state.clear()
+    task = db.update_task(task_id, message.from_user.id, deadline=deadline)
+    await finish_edit(message, state, task, "✅ Дедлайн обновлён")
 
 @dp.message(TaskStates.waiting_for_edit_category)
 async def process_edit_category(message: Message, state: FSMContext):
@@ -601,39 +964,8 @@ async def process_edit_category(message: Message, state: FSMContext):
     if message.text != "❌ Без категории" and message.text != "➕ Новая категория":
         category = message.text.strip()
     
-    if db.update_task(task_id, category=category):
-        await message.answer("✅ Категория обновлена", reply_markup=main_menu_keyboard())
-    else:
-        await message.answer("❌ Ошибка при обновлении", reply_markup=main_menu_keyboard())
-    
-    await state.clear()
-
-@dp.message(TaskStates.waiting_for_edit_priority)
-async def process_edit_priority(message: Message, state: FSMContext):
-    """Обработка нового приоритета"""
-    if message.text == "❌ Отмена":
-        await state.clear()
-        await message.answer("❌ Редактирование отменено", reply_markup=main_menu_keyboard())
-        return
-    
-    data = await state.get_data()
-    task_id = data.get("edit_task_id")
-    
-    priority_map = {
-        "Высокий 🔴": "Высокий",
-        "Средний 🟡": "Средний",
-        "Низкий 🟢": "Низкий",
-        "❌ Без приоритета": None
-    }
-    
-    priority = priority_map.get(message.text, message.text)
-    
-    if db.update_task(task_id, priority=priority):
-        await message.answer("✅ Приоритет обновлён", reply_markup=main_menu_keyboard())
-    else:
-        await message.answer("❌ Ошибка при обновлении", reply_markup=main_menu_keyboard())
-    
-    await state.clear()
+    task = db.update_task(task_id, message.from_user.id, category=category)
+    await finish_edit(message, state, task, "✅ Категория обновлена")
 
 # ==================== ПОИСК ====================
 
@@ -647,7 +979,7 @@ async def search_tasks_start(message: Message, state: FSMContext):
     )
     await state.set_state(TaskStates.waiting_for_search)
 
-@dp.message(TaskStates.waiting_for_search)
+@dp.message(TaskStates.waiting_for_search, flags={"throttling": "heavy"})
 async def process_search(message: Message, state: FSMContext):
     """Обработка поискового запроса"""
     if message.text == "❌ Отмена":
@@ -677,34 +1009,85 @@ async def search_tasks_action(message: Message, keyword: str):
     )
     
     for task in tasks:
-        status = "✅" if task['done'] == 1 else "❌"
+        status = "✅" if task.completed else ("🔕" if task.auto_closed else "❌")
         
-        task_text = f"{status} <b>{task['text']}</b>\n"
+        task_text = f"{status} <b>{task.text}</b>\n"
         
-        if task['deadline']:
-            try:
-                deadline_dt = datetime.fromisoformat(task['deadline'])
-                task_text += f"⏰ {deadline_dt.strftime('%d.%m.%Y %H:%M')}\n"
-            except:
-                task_text += f"⏰ {task['deadline']}\n"
+        if task.due:
+            task_text += f"⏰ {task.due.strftime('%d.%m.%Y %H:%M')}\n"
+        elif task.deadline:
+            task_text += f"⏰ {task.deadline}\n"
         
-        if task['category']:
-            task_text += f"🏷️ {task['category']}\n"
+        if task.category:
+            task_text += f"🏷️ {task.category}\n"
         
-        if task['priority']:
-            task_text += f"⚡ {task['priority']}\n"
+        if task.priority:
+            task_text += f"⚡ {task.priority}\n"
         
         await message.answer(
             task_text,
-            reply_markup=task_actions_keyboard(task['id'])
+            reply_markup=task_actions_keyboard(task.id)
         )
 
+# ==================== INLINE-ПОИСК ====================
+
+# Результаты inline-поиска: (user_id, запрос) -> (истекает, номер изменения пользователя, статьи)
+_inline_cache = OrderedDict()
+
+def inline_article(task):
+    """Результат inline-поиска: задача отправляется в чат карточкой"""
+    details = []
+    if task.due:
+        details.append(f"⏰ {task.due.strftime('%d.%m.%Y %H:%M')}")
+    elif task.deadline:
+        details.append(f"⏰ {task.deadline}")
+    if task.category:
+        details.append(f"🏷️ {task.category}")
+    if task.priority:
+        details.append(f"⚡ {task.priority}")
+    
+    return InlineQueryResultArticle(
+        id=str(task.id),
+        title=("✅ " if task.completed else "") + task.text[:100],
+        description=" ".join(details) or None,
+        input_message_content=InputTextMessageContent(message_text=format_task(task))
+    )
+
+@dp.inline_query()
+async def inline_search(inline_query: InlineQuery):
+    """Поиск задач по мере набора: @бот запрос"""
+    user_id = inline_query.from_user.id
+    text = " ".join(inline_query.query.split()).lower()
+    key = (user_id, text)
+    
+    # Кэш действует, пока не истёк срок и у пользователя не было изменений задач
+    change = db.last_user_change(user_id)
+    cached = _inline_cache.get(key)
+    if cached and cached[0] > time.monotonic() and cached[1] == change:
+        _inline_cache.move_to_end(key)
+        articles = cached[2]
+    else:
+        # Пустой запрос — ближайшие открытые задачи
+        tasks = db.search_tasks_prefix(user_id, text) if text else db.get_tasks(user_id, limit=50)
+        articles = [inline_article(task) for task in tasks]
+        _inline_cache[key] = (time.monotonic() + INLINE_RESULTS_TTL, change, articles)
+        _inline_cache.move_to_end(key)
+        while len(_inline_cache) > INLINE_CACHE_SIZE:
+            _inline_cache.popitem(last=False)
+    
+    await inline_query.answer(
+        articles,
+        cache_time=INLINE_CACHE_TIME,
+        is_personal=True,
+        button=None if articles else InlineQueryResultsButton(text="Задач не найдено — создать в боте", start_parameter="add")
+    )
+
 # ==================== СТАТИСТИКА ====================
 
-@dp.message(F.text == "📊 Статистика")
+@dp.message(F.text == "📊 Статистика", flags={"throttling": "heavy"})
 async def show_stats(message: Message):
     """Показ статистики"""
-    stats = db.get_user_stats(message.from_user.id)
+    stats = db.get_user_stats(message.from_user.id, include_archive=True)
     
     if not stats:
         await message.answer(
@@ -743,9 +1126,76 @@ async def show_stats(message: Message):
             stats_text += "💪 <b>Продолжайте в том же духе!</b>"
         else:
             stats_text += "📈 <b>Есть над чем поработать!</b>"
+        
+        stats_text += "\n\n" + format_trends(message.from_user.id)
     
     await message.answer(stats_text, reply_markup=main_menu_keyboard())
 
+SPARK_BLOCKS = "▁▂▃▄▅▆▇█"
+
+def sparkline(values):
+    """Мини-график из блоков, высота относительно максимума"""
+    top = max(values, default=0)
+    if not top:
+        return SPARK_BLOCKS[0] * len(values)
+    return "".join(SPARK_BLOCKS[round(value / top * (len(SPARK_BLOCKS) - 1))] for value in values)
+
+def completion_streaks(days):
+    """Текущая и лучшая серии дней подряд с выполненными задачами (days — даты от новых к старым)"""
+    dates = [date.fromisoformat(day) for day in days]
+    one_day = timedelta(days=1)
+    
+    runs = []
+    for index, day in enumerate(dates):
+        if index and dates[index - 1] - day == one_day:
+            runs[-1] += 1
+        else:
+            runs.append(1)
+    
+    # Текущая серия не прерывается, пока сегодняшний день не закончился
+    current = runs[0] if dates and date.today() - dates[0] <= one_day else 0
+    return current, max(runs, default=0)
+
+def format_lead_time(hours):
+    """Время выполнения в часах или днях"""
+    return f"{hours:.1f} ч" if hours < 48 else f"{hours / 24:.1f} дн"
+
+def format_trends(user_id):
+    """Динамика за 30/90 дней по дневным итогам"""
+    last_30 = db.get_period_stats(user_id, 30)
+    previous_30 = db.get_period_stats(user_id, 30, shift=30)
+    last_90 = db.get_period_stats(user_id, 90)
+    if not last_30 or not previous_30 or not last_90:
+        return ""
+    
+    # Недели без записей в дневных итогах — нули на графике
+    this_monday = date.today() - timedelta(days=date.today().weekday())
+    weekly = {row['week']: row['completed'] for row in db.get_weekly_stats(user_id, 12)}
+    week_values = [weekly.get((this_monday - timedelta(weeks=n)).isoformat(), 0) for n in range(11, -1, -1)]
+    
+    current_streak, best_streak = completion_streaks(db.get_completion_days(user_id))
+    
+    difference = last_30['completed'] - previous_30['completed']
+    trend = "↗️" if difference > 0 else "↘️" if difference < 0 else "➡️"
+    
+    text = (
+        f"📈 <b>Динамика</b>\n"
+        f"<b>За 30 дней:</b> выполнено {last_30['completed']} {trend} "
+        f"(предыдущие 30: {previous_30['completed']}), создано {last_30['created']}\n"
+        f"<b>За 90 дней:</b> выполнено {last_90['completed']}, создано {last_90['created']}\n"
+    )
+    if last_90['completed']:
+        on_time = 100 - last_90['completed_late'] / last_90['completed'] * 100
+        text += f"<b>В срок (90 дней):</b> {on_time:.0f}%\n"
+    if last_90['lead_count']:
+        text += f"<b>Среднее время выполнения:</b> {format_lead_time(last_90['lead_hours'] / last_90['lead_count'])}\n"
+    
+    text += (
+        f"<b>По неделям (12):</b> <code>{sparkline(week_values)}</code>\n"
+        f"🔥 <b>Серия:</b> {current_streak} дн. подряд (лучшая за год: {best_streak})"
+    )
+    return text
+
 # ==================== КАТЕГОРИИ ====================
 
 @dp.message(F.text == "🏷️ Мои категории")
@@ -770,6 +1220,55 @@ async def show_categories(message: Message):
     
     await message.answer(categories_text, reply_markup=main_menu_keyboard())
 
+# ==================== АДМИНИСТРИРОВАНИЕ ====================
+
+def command_seconds(command: CommandObject, default, limit):
+    """Длительность из аргумента команды (сек), не больше limit"""
+    try:
+        return min(max(int(command.args), 1), limit) if command.args else default
+    except ValueError:
+        return default
+
+def report_file(prefix, text):
+    """Текстовый отчёт как документ для отправки в чат"""
+    return BufferedInputFile(text.encode("utf-8"), filename=f"{prefix}-{datetime.now():%Y%m%d-%H%M%S}.txt")
+
+# Идущие профилирования: ссылки держим, чтобы задачи не собрал сборщик мусора
+_admin_jobs = set()
+
+def start_admin_job(message: Message, prefix, caption, collect):
+    """Сбор отчёта в фоне: обработчик отвечает сразу и не держит очередь обновлений администратора"""
+    async def job():
+        try:
+            report = await collect()
+            await message.answer_document(report_file(prefix, report), caption=caption)
+        except Exception as e:
+            logger.error(f"❌ Ошибка при сборе отчёта {prefix}: {e}")
+            await message.answer(f"❌ Не удалось собрать отчёт: {e}")
+    
+    task = asyncio.create_task(job())
+    _admin_jobs.add(task)
+    task.add_done_callback(_admin_jobs.discard)
+
+@dp.message(Command("profile"), F.from_user.id.in_(ADMIN_IDS))
+async def command_profile(message: Message, command: CommandObject):
+    """Сэмплирующий профиль цикла событий (только для администраторов)"""
+    duration = command_seconds(command, default=10, limit=60)
+    await message.answer(f"⏱ Профилирование цикла событий {duration} с, отчёт придёт отдельным сообщением")
+    
+    start_admin_job(message, "profile", "📈 Профиль цикла событий", lambda: profile_loop(duration))
+
+@dp.message(Command("memsnap"), F.from_user.id.in_(ADMIN_IDS))
+async def command_memsnap(message: Message, command: CommandObject):
+    """Разница распределений памяти за интервал (только для администраторов)"""
+    duration = command_seconds(command, default=30, limit=300)
+    await message.answer(f"🧠 Снимок памяти через {duration} с, отчёт придёт отдельным сообщением")
+    
+    start_admin_job(message, "memsnap", "🧠 Распределения памяти", lambda: memory_diff(duration, extra={
+        "Состояний FSM в MemoryStorage": len(storage.storage),
+        "Карточек в кэше правок": len(_card_states),
+    }))
+
 # ==================== ОБРАБОТКА НЕИЗВЕСТНЫХ КОМАНД ====================
 
 @dp.message()
@@ -786,16 +1285,58 @@ async def unknown_command(message: Message):
 
 # ==================== ЗАПУСК БОТА ====================
 
+@dp.startup()
+async def on_startup(bot: Bot):
+    """Инициализация ресурсов перед началом опроса обновлений"""
+    # Соединение с БД и проверка схемы — только при запуске, а не при импорте
+    db.connect()
+    
+    # Запускаем фоновые задачи
+    asyncio.create_task(reminder_loop(bot))
+    asyncio.create_task(archive_loop())
+    asyncio.create_task(backup_loop())
+    asyncio.create_task(maintenance_loop())
+    asyncio.create_task(loop_monitor.run())
+    
+    if tracer:
+        bot.session.middleware(RequestTracingMiddleware(tracer))
+    
+    global health_runner, calendar_runner
+    if HEALTH_PORT:
+        health_runner = await start_server(create_app(bot))
+    if CALENDAR_BASE_URL:
+        calendar_runner = await start_calendar_server()
+    
+    logger.info("✅ Фоновые задачи напоминаний, архивации, резервного копирования и обслуживания базы запущены")
+    logger.info("✅ Бот готов к работе!")
+
+@dp.shutdown()
+async def on_shutdown(bot: Bot):
+    """Итоговая статистика при остановке бота"""
+    logger.info(f"🌐 Статистика HTTP-сессии: {bot.session.stats.snapshot()}")
+    logger.info(f"📊 Очереди пользователей: {user_queue.stats.snapshot()}")
+    logger.info(f"🐢 Задержка цикла событий: {loop_monitor.snapshot()}")
+    logger.info(f"📅 Ленты календаря: {feed_stats}")
+    if recorder:
+        recorder.close()
+    if tracer:
+        tracer.close()
+    if health_runner:
+        await health_runner.cleanup()
+    if calendar_runner:
+        await calendar_runner.cleanup()
+
 async def main():
     """Основная функция запуска бота"""
+    setup_logging()
     logger.info("🚀 Бот запускается...")
     
     try:
-        # Запускаем фоновую задачу для напоминаний
-        asyncio.create_task(reminder_loop(bot))
-        
-        logger.info("✅ Фоновая задача напоминаний запущена")
-        logger.info("✅ Бот готов к работе!")
+        bot = Bot(
+            token=require_token(),
+            session=create_bot_session(),
+            default=DefaultBotProperties(parse_mode=ParseMode.HTML)
+        )
         
         # Запускаем опрос обновлений
         await dp.start_polling(bot)
@@ -0,0 +1,163 @@
+import hashlib
+import hmac
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+from aiohttp import web
+
+from db_handler import db
+from config import TOKEN, CALENDAR_SECRET, CALENDAR_BASE_URL, CALENDAR_HOST, CALENDAR_PORT, CALENDAR_CACHE_SIZE
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Правило повторения задачи -> RRULE
+RRULE_FREQ = {
+    "Ежедневно": "DAILY",
+    "Еженедельно": "WEEKLY",
+    "Ежемесячно": "MONTHLY",
+}
+
+# Отрисованные ленты: user_id -> (ETag, Last-Modified, тело); вытесняются давно не запрошенные
+_feed_cache = OrderedDict()
+feed_stats = {"hits": 0, "misses": 0, "not_modified": 0}
+
+def _secret():
+    # Без отдельного ключа ссылки подписываются токеном бота, чтобы не меняться при перезапуске
+    return (CALENDAR_SECRET or TOKEN or "").encode()
+
+def feed_token(user_id):
+    """Подпись ссылки на календарь пользователя"""
+    return hmac.new(_secret(), f"calendar:{user_id}".encode(), hashlib.sha256).hexdigest()[:32]
+
+def feed_url(user_id):
+    """Ссылка на ленту iCalendar пользователя"""
+    return f"{CALENDAR_BASE_URL}/calendar/{user_id}/{feed_token(user_id)}.ics"
+
+def _escape(text):
+    """Экранирование текстового значения iCalendar"""
+    return text.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+
+def _fold(line):
+    """Перенос строк длиннее 75 байт (RFC 5545, 3.1)"""
+    data = line.encode("utf-8")
+    if len(data) <= 75:
+        return line
+    
+    parts = []
+    while data:
+        limit = 75 if not parts else 74
+        # Не разрезаем многобайтный символ UTF-8
+        while limit < len(data) and (data[limit] & 0xC0) == 0x80:
+            limit -= 1
+        parts.append(data[:limit].decode("utf-8"))
+        data = data[limit:]
+    return "\r\n ".join(parts)
+
+def render_feed(tasks, stamp):
+    """Лента iCalendar: событие на каждый дедлайн открытой задачи (tasks — любой итерируемый поток Task)"""
+    dtstamp = stamp.strftime("%Y%m%dT%H%M%SZ")
+    lines = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        "PRODID:-//TO-DO TgBot//RU",
+        "CALSCALE:GREGORIAN",
+        "X-WR-CALNAME:Задачи",
+    ]
+    
+    for task in tasks:
+        if not task.due:
+            continue
+        start = task.due
+        
+        # Дедлайн хранится без часового пояса: «плавающее» время календаря
+        lines += [
+            "BEGIN:VEVENT",
+            f"UID:task-{task.id}@todo-bot",
+            f"DTSTAMP:{dtstamp}",
+            f"DTSTART:{start.strftime('%Y%m%dT%H%M%S')}",
+            f"DTEND:{(start + timedelta(minutes=30)).strftime('%Y%m%dT%H%M%S')}",
+            f"SUMMARY:{_escape(task.text)}",
+        ]
+        if task.category:
+            lines.append(f"CATEGORIES:{_escape(task.category)}")
+        if task.priority:
+            lines.append(f"DESCRIPTION:{_escape('Приоритет: ' + task.priority)}")
+        if task.repeat in RRULE_FREQ:
+            lines.append(f"RRULE:FREQ={RRULE_FREQ[task.repeat]}")
+        lines.append("END:VEVENT")
+    
+    lines.append("END:VCALENDAR")
+    return "\r\n".join(_fold(line) for line in lines) + "\r\n"
+
+def _parse_timestamp(value):
+    """CURRENT_TIMESTAMP SQLite (UTC) -> datetime"""
+    return datetime.strptime(value, "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc)
+
+def _get_feed(user_id):
+    """ETag, Last-Modified и тело ленты; тело берётся из кэша, пока данные не изменились"""
+    version = db.get_calendar_version(user_id)
+    if version is None:
+        return None
+    
+    # Удаление не меняет updated_at оставшихся задач, поэтому учитываем и журнал изменений
+    stamps = [_parse_timestamp(value) for value in (version['updated_at'], version['changed_at']) if value]
+    last_modified = max(stamps, default=datetime.fromtimestamp(0, timezone.utc))
+    etag = f'"{user_id}-{version["seq"] or 0}-{int(last_modified.timestamp())}"'
+    
+    cached = _feed_cache.get(user_id)
+    if cached and cached[0] == etag:
+        _feed_cache.move_to_end(user_id)
+        feed_stats["hits"] += 1
+        return cached
+    
+    feed_stats["misses"] += 1
+    body = render_feed(db.iter_tasks(user_id, with_deadline=True), last_modified).encode("utf-8")
+    _feed_cache[user_id] = (etag, last_modified, body)
+    _feed_cache.move_to_end(user_id)
+    while len(_feed_cache) > CALENDAR_CACHE_SIZE:
+        _feed_cache.popitem(last=False)
+    return _feed_cache[user_id]
+
+async def calendar_feed(request):
+    """Лента iCalendar пользователя с условными запросами (ETag / Last-Modified)"""
+    user_id = int(request.match_info["user_id"])
+    if not hmac.compare_digest(request.match_info["token"], feed_token(user_id)):
+        raise web.HTTPNotFound()
+    
+    feed = _get_feed(user_id)
+    if feed is None:
+        raise web.HTTPServiceUnavailable()
+    etag, last_modified, body = feed
+    
+    headers = {
+        "ETag": etag,
+        "Last-Modified": last_modified.strftime("%a, %d %b %Y %H:%M:%S GMT"),
+        "Cache-Control": "private, max-age=300",
+    }
+    
+    # If-None-Match важнее If-Modified-Since (RFC 9110, 13.2.2)
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match is not None:
+        not_modified = etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*"
+    else:
+        since = request.if_modified_since
+        not_modified = since is not None and last_modified.replace(microsecond=0) <= since
+    
+    if not_modified:
+        feed_stats["not_modified"] += 1
+        return web.Response(status=304, headers=headers)
+    
+    return web.Response(body=body, content_type="text/calendar", charset="utf-8", headers=headers)
+
+async def start_calendar_server(host=CALENDAR_HOST, port=CALENDAR_PORT):
+    """Запуск публичного сервера ленты, возвращает runner для остановки"""
+    # Отдельное приложение: служебные /healthz и /readyz наружу не попадают
+    app = web.Application()
+    app.router.add_get(r"/calendar/{user_id:\d+}/{token:[0-9a-f]+}.ics", calendar_feed)
+    
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"📅 Лента календаря: http://{host}:{port}/calendar/, внешний адрес {CALENDAR_BASE_URL}")
+    return runner
\ No newline at end of file
@@ -7,5 +7,99 @@ load_dotenv()
 # Получаем токен из переменных окружения
 TOKEN = os.getenv("BOT_TOKEN")
 
-if not TOKEN:
-    raise ValueError("❌ Токен бота не найден! Убедитесь, что создали файл .env с BOT_TOKEN")
\ No newline at end of file
+def require_token():
+    """Токен бота; проверяется при запуске бота, а не при импорте"""
+    if not TOKEN:
+        raise ValueError("❌ Токен бота не найден! Убедитесь, что создали файл .env с BOT_TOKEN")
+    return TOKEN
+
+# Путь к файлу базы данных
+DB_PATH = os.getenv("DB_PATH", "tasks.db")
+
+# Смещения напоминаний по умолчанию: секунды до дедлайна через запятую (за 1 час и в момент дедлайна)
+REMINDER_OFFSETS = os.getenv("REMINDER_OFFSETS", "3600,0")
+
+# Архивация выполненных задач
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "30"))      # Через сколько дней выполненная задача уходит в архив
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))     # Размер пачки в одной транзакции
+ARCHIVE_INTERVAL = int(os.getenv("ARCHIVE_INTERVAL", "3600"))        # Период запуска архиватора (сек)
+
+# Журнал изменений задач (сжимается вместе с архивацией)
+CHANGE_LOG_KEEP = int(os.getenv("CHANGE_LOG_KEEP", "100000"))        # Сколько последних записей хранить
+
+# Резервное копирование базы данных
+BACKUP_DIR = os.getenv("BACKUP_DIR", "backups")                       # Каталог для сжатых копий
+BACKUP_INTERVAL = int(os.getenv("BACKUP_INTERVAL", "86400"))          # Период резервного копирования (сек)
+BACKUP_KEEP = int(os.getenv("BACKUP_KEEP", "7"))                      # Сколько последних копий хранить
+BACKUP_PAGES_PER_STEP = int(os.getenv("BACKUP_PAGES_PER_STEP", "256"))  # Страниц за один шаг копирования
+BACKUP_STEP_SLEEP = float(os.getenv("BACKUP_STEP_SLEEP", "0.05"))     # Пауза перед повтором шага, если база занята (сек)
+
+# Обслуживание базы (ANALYZE, PRAGMA optimize, incremental_vacuum)
+MAINTENANCE_START_HOUR = int(os.getenv("MAINTENANCE_START_HOUR", "3"))  # Начало окна низкой нагрузки (час)
+MAINTENANCE_END_HOUR = int(os.getenv("MAINTENANCE_END_HOUR", "5"))      # Конец окна (час)
+MAINTENANCE_BUDGET = float(os.getenv("MAINTENANCE_BUDGET", "5"))        # Бюджет времени на перевод в INCREMENTAL и очистку страниц (сек)
+MAINTENANCE_VACUUM_PAGES = int(os.getenv("MAINTENANCE_VACUUM_PAGES", "500"))  # Страниц за один шаг incremental_vacuum
+MAINTENANCE_FULL_VACUUM_MAX_MB = int(os.getenv("MAINTENANCE_FULL_VACUUM_MAX_MB", "50"))  # Максимальный размер для перевода в INCREMENTAL
+MAINTENANCE_VACUUM_MB_PER_SEC = float(os.getenv("MAINTENANCE_VACUUM_MB_PER_SEC", "20"))  # Оценка скорости полного VACUUM для проверки бюджета
+
+# Отправка напоминаний через очередь (outbox)
+REMINDER_BATCH_SIZE = int(os.getenv("REMINDER_BATCH_SIZE", "100"))    # Размер пачки при захвате
+REMINDER_LEASE = int(os.getenv("REMINDER_LEASE", "300"))              # Аренда захваченной пачки (сек)
+REMINDER_MAX_ATTEMPTS = int(os.getenv("REMINDER_MAX_ATTEMPTS", "5"))  # Попыток отправки до отказа
+
+# Очередь обновлений на пользователя
+USER_QUEUE_DEPTH = int(os.getenv("USER_QUEUE_DEPTH", "10"))           # Максимум обновлений в очереди одного пользователя
+
+# Ограничение частоты запросов: группа -> (токенов в секунду, ёмкость корзины)
+THROTTLE_BUDGETS = {
+    "default": (float(os.getenv("THROTTLE_DEFAULT_RATE", "2")), int(os.getenv("THROTTLE_DEFAULT_BURST", "10"))),
+    "heavy": (float(os.getenv("THROTTLE_HEAVY_RATE", "0.2")), int(os.getenv("THROTTLE_HEAVY_BURST", "3"))),
+}
+
+# HTTP-сессия Bot API
+BOT_API_URL = os.getenv("BOT_API_URL")                                # Свой сервер Bot API (например, локальный для нагрузочных тестов)
+SESSION_POOL_LIMIT = int(os.getenv("SESSION_POOL_LIMIT", "20"))       # Максимум одновременных соединений
+SESSION_KEEPALIVE = int(os.getenv("SESSION_KEEPALIVE", "60"))         # Время жизни простаивающего соединения (сек)
+SESSION_DNS_TTL = int(os.getenv("SESSION_DNS_TTL", "3600"))           # Кэш DNS (сек)
+SESSION_TIMEOUT = float(os.getenv("SESSION_TIMEOUT", "15"))           # Общий таймаут; к getUpdates добавляется время long polling
+SESSION_METHOD_TIMEOUTS = {                                           # Таймауты отдельных методов (сек)
+    "sendMessage": float(os.getenv("SESSION_SEND_TIMEOUT", "10")),
+    "editMessageText": float(os.getenv("SESSION_SEND_TIMEOUT", "10")),
+    "editMessageReplyMarkup": float(os.getenv("SESSION_SEND_TIMEOUT", "10")),
+    "answerCallbackQuery": float(os.getenv("SESSION_CALLBACK_TIMEOUT", "5")),
+}
+
+# Запись входящих обновлений для воспроизведения нагрузки (по умолчанию выключена)
+UPDATE_LOG_PATH = os.getenv("UPDATE_LOG_PATH")                        # Путь к .jsonl.gz; пусто — запись выключена
+UPDATE_LOG_SECRET = os.getenv("UPDATE_LOG_SECRET")                    # Ключ HMAC для псевдонимов пользователей
+
+# Мониторинг цикла событий и HTTP-проверки состояния
+HEALTH_HOST = os.getenv("HEALTH_HOST", "127.0.0.1")                   # Адрес HTTP-сервера /healthz и /readyz
+HEALTH_PORT = int(os.getenv("HEALTH_PORT", "8080"))                   # Порт; 0 — сервер не запускается
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.25"))     # Период измерения задержки цикла (сек)
+LOOP_LAG_THRESHOLD = float(os.getenv("LOOP_LAG_THRESHOLD", "1.0"))    # Задержка, после которой снимается стек (сек)
+READY_POLLING_STALE = int(os.getenv("READY_POLLING_STALE", "90"))     # Допустимое время без успешного getUpdates (сек)
+READY_REMINDER_DELAY = int(os.getenv("READY_REMINDER_DELAY", "300"))  # Допустимое отставание напоминаний (сек)
+
+# Трассировка обновлений (по умолчанию выключена)
+TRACE_PATH = os.getenv("TRACE_PATH")                                  # Файл JSONL для span; пусто — трассировка выключена
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.01"))     # Доля сохраняемых обычных трасс
+TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "1000"))             # Трассы дольше этого сохраняются всегда (мс)
+
+# Администраторы бота (команды /profile и /memsnap)
+ADMIN_IDS = {int(user_id) for user_id in os.getenv("ADMIN_IDS", "").split(",") if user_id.strip()}
+
+# Быстрое добавление задач одним сообщением
+QUICK_ADD_MAX_TASKS = int(os.getenv("QUICK_ADD_MAX_TASKS", "50"))     # Максимум задач (строк) в одном сообщении
+
+# Лента iCalendar с дедлайнами (отдельный HTTP-сервер, по умолчанию выключена)
+CALENDAR_BASE_URL = os.getenv("CALENDAR_BASE_URL")                    # Внешний адрес ленты для ссылок; пусто — /calendar выключен
+CALENDAR_HOST = os.getenv("CALENDAR_HOST", "0.0.0.0")                 # Адрес сервера ленты (/healthz и /readyz на нём нет)
+CALENDAR_PORT = int(os.getenv("CALENDAR_PORT", "8081"))               # Порт сервера ленты
+CALENDAR_SECRET = os.getenv("CALENDAR_SECRET")                        # Ключ подписи ссылок; пусто — подпись токеном бота
+CALENDAR_CACHE_SIZE = int(os.getenv("CALENDAR_CACHE_SIZE", "1000"))   # Сколько отрисованных лент держать в памяти
+
+# Inline-поиск задач (@бот запрос)
+INLINE_CACHE_TIME = int(os.getenv("INLINE_CACHE_TIME", "10"))         # cache_time ответа: сколько Telegram кэширует результаты (сек)
+INLINE_RESULTS_TTL = int(os.getenv("INLINE_RESULTS_TTL", "30"))       # Время жизни результатов в кэше бота (сек)
+INLINE_CACHE_SIZE = int(os.getenv("INLINE_CACHE_SIZE", "1000"))       # Максимум запросов в кэше бота
\ No newline at end of file
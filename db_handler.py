@@ -1,17 +1,121 @@
 import sqlite3
+import time
 from datetime import datetime, timedelta
+from typing import NamedTuple, Optional
+from config import DB_PATH, REMINDER_OFFSETS
+from recurrence import next_task_occurrence
 import logging
 
-# Настройка логирования
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Версия схемы: при совпадении с PRAGMA user_version DDL не выполняется
+SCHEMA_VERSION = 13
+
+# Поля задачи для отображения и изменяющих запросов (RETURNING); порядок совпадает с полями Task
+TASK_COLUMNS = "id, user_id, text, done, deadline, category, priority, repeat, reminder_offsets, repeat_anchor, occurrence, auto_closed"
+# Те же поля из архива: правил напоминаний и повторений там нет
+ARCHIVE_TASK_COLUMNS = "id, user_id, text, done, deadline, category, priority, repeat, NULL, NULL, 0, auto_closed"
+# Порядок списков задач: приоритет, затем ближайший дедлайн
+TASKS_ORDER = """ ORDER BY 
+    CASE priority 
+        WHEN 'Высокий' THEN 1
+        WHEN 'Средний' THEN 2
+        WHEN 'Низкий' THEN 3
+        ELSE 4
+    END,
+    deadline ASC
+"""
+
+class Task(NamedTuple):
+    """Задача: доступ по атрибутам, дедлайн разобран один раз при чтении (due)"""
+    id: int
+    user_id: int
+    text: str
+    done: int
+    deadline: Optional[str]
+    category: Optional[str]
+    priority: Optional[str]
+    repeat: Optional[str]
+    reminder_offsets: Optional[str]
+    repeat_anchor: Optional[str]
+    occurrence: Optional[int]
+    auto_closed: Optional[int]
+    due: Optional[datetime]
+    
+    @property
+    def completed(self):
+        """Выполнена пользователем (закрытие напоминанием по дедлайну не считается)"""
+        return self.done == 1 and not self.auto_closed
+    
+    def __getitem__(self, key):
+        # Помощники, общие с sqlite3.Row (повторения, напоминания), обращаются по имени столбца
+        if isinstance(key, str):
+            return getattr(self, key)
+        return tuple.__getitem__(self, key)
+
+_new_task = tuple.__new__
+
+def task_factory(cursor, row):
+    """row_factory для запросов, выбирающих TASK_COLUMNS"""
+    deadline = row[4]
+    try:
+        due = datetime.fromisoformat(deadline) if deadline else None
+    except ValueError:
+        due = None
+    # Сразу tuple.__new__: сгенерированный Task.__new__ с разбором аргументов заметно медленнее
+    return _new_task(Task, (*row, due))
+
+def compute_next_fire_at(deadline, offsets=REMINDER_OFFSETS, after=None):
+    """Ближайший момент напоминания (epoch) после after; offsets — секунды до дедлайна через запятую"""
+    if not deadline:
+        return None
+    
+    try:
+        deadline_ts = datetime.fromisoformat(deadline).timestamp()
+        fire_times = sorted(deadline_ts - int(offset) for offset in (offsets or "").split(",") if offset.strip())
+    except (ValueError, TypeError):
+        return None
+    
+    after = time.time() if after is None else after
+    for fire_at in fire_times:
+        if after < fire_at < deadline_ts:
+            return int(fire_at)
+    
+    # Само наступление дедлайна напоминает всегда, даже если он уже прошёл
+    return int(deadline_ts)
+
 class Database:
-    def __init__(self, db_name="tasks.db"):
-        self.conn = sqlite3.connect(db_name, check_same_thread=False)
+    def __init__(self, db_name=DB_PATH):
+        # Соединение открывается явно через connect() при запуске бота
+        self.db_name = db_name
+        self.conn = None
+        self.cursor = None
+        self.task_cursor = None
+    
+    def connect(self, db_name=None):
+        """Открытие соединения и проверка схемы базы данных"""
+        if db_name:
+            self.db_name = db_name
+        
+        self.conn = sqlite3.connect(self.db_name, check_same_thread=False)
         self.conn.row_factory = sqlite3.Row
         self.cursor = self.conn.cursor()
+        # Запросы, возвращающие задачи, читают строки сразу в Task
+        self.task_cursor = self.conn.cursor()
+        self.task_cursor.row_factory = task_factory
+        
+        version = self.cursor.execute("PRAGMA user_version").fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            logger.info(f"✅ Схема базы данных актуальна (версия {version})")
+            return
+        
+        # Новая база сразу создаётся с инкрементальной очисткой; для существующей это не действует до VACUUM
+        if version == 0:
+            self.cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        
         self.create_tables()
+        self.cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self.conn.commit()
     
     def create_tables(self):
         """Создание таблиц в базе данных"""
@@ -35,209 +139,1162 @@ class Database:
         self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_deadline ON tasks(deadline)")
         self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_category ON tasks(category)")
         self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_priority ON tasks(priority)")
+        # Повестка (сегодня / неделя / просрочено): один проход по диапазону дедлайнов открытых задач
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_tasks_agenda ON tasks(user_id, done, deadline)")
+        
+        # Столбцы, добавленные после первой версии схемы
+        self._add_column("tasks", "reminder_offsets", f"TEXT DEFAULT '{REMINDER_OFFSETS}'")
+        if self._add_column("tasks", "next_fire_at", "INTEGER"):
+            self._backfill_next_fire_at()
+        self.cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_next_fire_at ON tasks(next_fire_at) 
+            WHERE next_fire_at IS NOT NULL
+        """)
+        
+        # Повторение хранится правилом: первый дедлайн (NULL — текущий) и номер текущего повторения
+        self._add_column("tasks", "repeat_anchor", "TEXT")
+        self._add_column("tasks", "occurrence", "INTEGER DEFAULT 0")
+        # Разовая задача, закрытая напоминанием по дедлайну, пока пользователь её не подтвердил
+        self._add_column("tasks", "auto_closed", "INTEGER DEFAULT 0")
+        # Просрочено: неподтверждённые автозакрытия (частичный индекс, таких строк немного)
+        self.cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_tasks_auto_closed ON tasks(user_id, deadline) 
+            WHERE auto_closed = 1
+        """)
+        # Архивация: только подтверждённые выполненные задачи (автозакрытые ждут в «Просрочено»)
+        self.cursor.execute("DROP INDEX IF EXISTS idx_done_updated")
+        self.cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_tasks_archivable ON tasks(updated_at) 
+            WHERE done = 1 AND auto_closed = 0
+        """)
+        
+        # История закрытых повторений (вместо новой строки в tasks на каждое повторение)
+        self.cursor.execute("""
+        CREATE TABLE IF NOT EXISTS task_completions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            task_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            due_at TEXT,
+            auto INTEGER DEFAULT 0,
+            completed_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+        """)
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_completions_user ON task_completions(user_id, completed_at)")
+        
+        # Архив выполненных задач (холодное хранилище)
+        self.cursor.execute("""
+        CREATE TABLE IF NOT EXISTS tasks_archive (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            text TEXT NOT NULL,
+            done INTEGER DEFAULT 1,
+            deadline TEXT,
+            category TEXT,
+            priority TEXT,
+            repeat TEXT,
+            created_at TEXT,
+            updated_at TEXT,
+            archived_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+        """)
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_archive_user_id ON tasks_archive(user_id)")
+        self._add_column("tasks_archive", "auto_closed", "INTEGER DEFAULT 0")
+        
+        # Очередь напоминаний к отправке (outbox)
+        self.cursor.execute("""
+        CREATE TABLE IF NOT EXISTS reminder_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            task_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            text TEXT NOT NULL,
+            deadline TEXT,
+            attempts INTEGER DEFAULT 0,
+            claimed_until REAL,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+        """)
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_outbox_claimed ON reminder_outbox(claimed_until)")
+        self._add_column("reminder_outbox", "kind", "TEXT DEFAULT 'deadline'")
+        self._add_column("reminder_outbox", "next_deadline", "TEXT")
+        
+        # Категории пользователя со счётчиком задач в tasks (для выбора без сканирования задач).
+        # Счётчик ведут триггеры в той же записи, что и изменение задачи; удаление и архивация его уменьшают
+        categories_counted = self.cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'trg_tasks_insert_category'"
+        ).fetchone()
+        self.cursor.execute("""
+        CREATE TABLE IF NOT EXISTS categories (
+            user_id INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            usage_count INTEGER DEFAULT 0,
+            last_used_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, name)
+        )
+        """)
+        self.cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_categories_usage 
+            ON categories(user_id, usage_count DESC, last_used_at DESC)
+        """)
+        self.cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_tasks_insert_category AFTER INSERT ON tasks
+            WHEN NEW.category IS NOT NULL AND NEW.category != ''
+            BEGIN
+                INSERT INTO categories (user_id, name, usage_count, last_used_at) 
+                VALUES (NEW.user_id, NEW.category, 1, CURRENT_TIMESTAMP)
+                ON CONFLICT(user_id, name) DO UPDATE 
+                SET usage_count = usage_count + 1, last_used_at = excluded.last_used_at;
+            END
+        """)
+        self.cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_tasks_delete_category AFTER DELETE ON tasks
+            WHEN OLD.category IS NOT NULL AND OLD.category != ''
+            BEGIN
+                UPDATE categories SET usage_count = usage_count - 1 
+                WHERE user_id = OLD.user_id AND name = OLD.category;
+            END
+        """)
+        self.cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_tasks_update_category AFTER UPDATE OF category ON tasks
+            WHEN NEW.category IS NOT OLD.category
+            BEGIN
+                UPDATE categories SET usage_count = usage_count - 1 
+                WHERE user_id = OLD.user_id AND name = OLD.category;
+                INSERT INTO categories (user_id, name, usage_count, last_used_at) 
+                SELECT NEW.user_id, NEW.category, 1, CURRENT_TIMESTAMP 
+                WHERE NEW.category IS NOT NULL AND NEW.category != ''
+                ON CONFLICT(user_id, name) DO UPDATE 
+                SET usage_count = usage_count + 1, last_used_at = excluded.last_used_at;
+            END
+        """)
+        if not categories_counted:
+            self._backfill_categories()
+        
+        # Журнал изменений задач: пишется триггерами в той же транзакции, что и само изменение.
+        # AUTOINCREMENT не даёт номерам повториться после сжатия журнала
+        self.cursor.execute("""
+        CREATE TABLE IF NOT EXISTS task_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            task_id INTEGER NOT NULL,
+            op TEXT NOT NULL,
+            changed_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+        """)
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_task_changes_user ON task_changes(user_id, seq)")
+        self.cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_tasks_insert_log AFTER INSERT ON tasks
+            BEGIN
+                INSERT INTO task_changes (user_id, task_id, op) VALUES (NEW.user_id, NEW.id, 'insert');
+            END
+        """)
+        # Служебные next_fire_at и updated_at не видны пользователю и в журнал не попадают.
+        # Список столбцов менялся между версиями схемы, поэтому триггер пересоздаётся
+        self.cursor.execute("DROP TRIGGER IF EXISTS trg_tasks_update_log")
+        self.cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_tasks_update_log 
+            AFTER UPDATE OF text, done, deadline, category, priority, repeat, reminder_offsets, 
+                            repeat_anchor, occurrence, auto_closed ON tasks
+            BEGIN
+                INSERT INTO task_changes (user_id, task_id, op) VALUES (NEW.user_id, NEW.id, 'update');
+            END
+        """)
+        # Перенос в архив тоже удаляет строку из tasks и записывается как 'delete'
+        self.cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_tasks_delete_log AFTER DELETE ON tasks
+            BEGIN
+                INSERT INTO task_changes (user_id, task_id, op) VALUES (OLD.user_id, OLD.id, 'delete');
+            END
+        """)
+        
+        # Дневные итоги пользователя для динамики в статистике; ведутся триггерами и не зависят от архивации.
+        # День — по местному времени бота, как и дедлайны
+        daily_stats_exist = self.cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'daily_stats'"
+        ).fetchone()
+        self.cursor.execute("""
+        CREATE TABLE IF NOT EXISTS daily_stats (
+            user_id INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            created INTEGER DEFAULT 0,
+            completed INTEGER DEFAULT 0,
+            completed_late INTEGER DEFAULT 0,
+            lead_hours REAL DEFAULT 0,
+            lead_count INTEGER DEFAULT 0,
+            PRIMARY KEY (user_id, day)
+        ) WITHOUT ROWID
+        """)
+        self.cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_tasks_insert_daily AFTER INSERT ON tasks
+            BEGIN
+                INSERT INTO daily_stats (user_id, day, created) 
+                VALUES (NEW.user_id, date(NEW.created_at, 'localtime'), 1)
+                ON CONFLICT(user_id, day) DO UPDATE SET created = created + 1;
+            END
+        """)
+        # Выполненной считается задача, закрытая пользователем: автозакрытие по дедлайну не в счёт,
+        # а его подтверждение (auto_closed 1 -> 0) считается выполнением в момент подтверждения.
+        # Время выполнения считается только до первого переноса повторяющейся задачи:
+        # дальше created_at уже не начало текущего повторения.
+        # Условия триггеров менялись между версиями схемы, поэтому они пересоздаются
+        self.cursor.execute("DROP TRIGGER IF EXISTS trg_tasks_done_daily")
+        self.cursor.execute("DROP TRIGGER IF EXISTS trg_tasks_undone_daily")
+        self.cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_tasks_done_daily AFTER UPDATE OF done, auto_closed ON tasks
+            WHEN NOT (OLD.done = 1 AND OLD.auto_closed = 0) AND NEW.done = 1 AND NEW.auto_closed = 0
+            BEGIN
+                INSERT INTO daily_stats (user_id, day, completed, completed_late, lead_hours, lead_count) 
+                VALUES (
+                    NEW.user_id, 
+                    date(NEW.updated_at, 'localtime'), 
+                    1,
+                    NEW.deadline IS NOT NULL AND datetime(NEW.deadline) < datetime(NEW.updated_at, 'localtime'),
+                    CASE WHEN NEW.repeat_anchor IS NULL 
+                         THEN (julianday(NEW.updated_at) - julianday(NEW.created_at)) * 24 ELSE 0 END,
+                    NEW.repeat_anchor IS NULL
+                )
+                ON CONFLICT(user_id, day) DO UPDATE 
+                SET completed = completed + 1, 
+                    completed_late = completed_late + excluded.completed_late,
+                    lead_hours = lead_hours + excluded.lead_hours,
+                    lead_count = lead_count + excluded.lead_count;
+            END
+        """)
+        # Отмена выполнения (но не перенос повторения: он меняет occurrence) вычитает то, что добавило выполнение
+        self.cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_tasks_undone_daily AFTER UPDATE OF done, auto_closed ON tasks
+            WHEN OLD.done = 1 AND OLD.auto_closed = 0 AND NOT (NEW.done = 1 AND NEW.auto_closed = 0) 
+                 AND NEW.occurrence IS OLD.occurrence
+            BEGIN
+                UPDATE daily_stats 
+                SET completed = completed - 1,
+                    completed_late = completed_late - (
+                        OLD.deadline IS NOT NULL AND datetime(OLD.deadline) < datetime(OLD.updated_at, 'localtime')
+                    ),
+                    lead_hours = lead_hours - CASE WHEN OLD.repeat_anchor IS NULL 
+                        THEN (julianday(OLD.updated_at) - julianday(OLD.created_at)) * 24 ELSE 0 END,
+                    lead_count = lead_count - (OLD.repeat_anchor IS NULL)
+                WHERE user_id = OLD.user_id AND day = date(OLD.updated_at, 'localtime');
+            END
+        """)
+        if not daily_stats_exist:
+            self._backfill_daily_stats()
+        
+        # Полнотекстовый индекс по тексту задач с префиксными индексами (поиск по мере набора).
+        # Текст не дублируется (contentless), а токен владельца owner отсекает чужие задачи внутри индекса
+        # «ё» индексируется как «е»: при наборе её обычно пропускают
+        fts_exist = self.cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'tasks_fts'"
+        ).fetchone()
+        self.cursor.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5(
+                text, owner, 
+                content = '', 
+                prefix = '1 2 3', 
+                tokenize = 'unicode61 remove_diacritics 2'
+            )
+        """)
+        self.cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_tasks_insert_fts AFTER INSERT ON tasks
+            BEGIN
+                INSERT INTO tasks_fts (rowid, text, owner) VALUES (NEW.id, replace(replace(NEW.text, 'ё', 'е'), 'Ё', 'Е'), 'u' || NEW.user_id);
+            END
+        """)
+        self.cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_tasks_delete_fts AFTER DELETE ON tasks
+            BEGIN
+                INSERT INTO tasks_fts (tasks_fts, rowid, text, owner) 
+                VALUES ('delete', OLD.id, replace(replace(OLD.text, 'ё', 'е'), 'Ё', 'Е'), 'u' || OLD.user_id);
+            END
+        """)
+        self.cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_tasks_update_fts AFTER UPDATE OF text ON tasks
+            BEGIN
+                INSERT INTO tasks_fts (tasks_fts, rowid, text, owner) 
+                VALUES ('delete', OLD.id, replace(replace(OLD.text, 'ё', 'е'), 'Ё', 'Е'), 'u' || OLD.user_id);
+                INSERT INTO tasks_fts (rowid, text, owner) VALUES (NEW.id, replace(replace(NEW.text, 'ё', 'е'), 'Ё', 'Е'), 'u' || NEW.user_id);
+            END
+        """)
+        if not fts_exist:
+            self.cursor.execute("""
+                INSERT INTO tasks_fts (rowid, text, owner) SELECT id, replace(replace(text, 'ё', 'е'), 'Ё', 'Е'), 'u' || user_id FROM tasks
+            """)
         
         self.conn.commit()
         logger.info("✅ Таблицы базы данных созданы/проверены")
     
+    def _add_column(self, table, column, definition):
+        """Добавление столбца, если его ещё нет; возвращает True, если столбец добавлен"""
+        columns = [row['name'] for row in self.cursor.execute(f"PRAGMA table_info({table})")]
+        if column in columns:
+            return False
+        
+        self.cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        logger.info(f"🛠 Добавлен столбец {table}.{column}")
+        return True
+    
+    def _backfill_next_fire_at(self):
+        """Расчёт ближайшего напоминания для уже существующих задач"""
+        rows = self.cursor.execute("""
+            SELECT id, deadline, reminder_offsets FROM tasks 
+            WHERE done = 0 AND deadline IS NOT NULL
+        """).fetchall()
+        self.cursor.executemany(
+            "UPDATE tasks SET next_fire_at = ? WHERE id = ?",
+            [(compute_next_fire_at(row['deadline'], row['reminder_offsets']), row['id']) for row in rows]
+        )
+    
+    def _backfill_categories(self):
+        """Пересчёт счётчиков категорий по задачам в tasks (до схемы 11 счётчики только росли)"""
+        self.cursor.execute("UPDATE categories SET usage_count = 0")
+        self.cursor.execute("""
+            INSERT INTO categories (user_id, name, usage_count, last_used_at)
+            SELECT user_id, category, COUNT(*), MAX(updated_at) FROM tasks
+            WHERE category IS NOT NULL AND category != ''
+            GROUP BY user_id, category
+            ON CONFLICT(user_id, name) DO UPDATE SET usage_count = excluded.usage_count
+        """)
+    
+    def _backfill_daily_stats(self):
+        """Дневные итоги по уже существующим, архивным задачам и закрытым повторениям"""
+        self.cursor.execute("""
+            INSERT INTO daily_stats (user_id, day, created, completed, completed_late, lead_hours, lead_count)
+            SELECT user_id, day, SUM(created), SUM(completed), SUM(late), SUM(lead_hours), SUM(lead_count) FROM (
+                SELECT user_id, date(created_at, 'localtime') AS day, 1 AS created, 
+                       0 AS completed, 0 AS late, 0 AS lead_hours, 0 AS lead_count 
+                FROM (SELECT user_id, created_at FROM tasks UNION ALL SELECT user_id, created_at FROM tasks_archive)
+                UNION ALL
+                SELECT user_id, date(updated_at, 'localtime'), 0, 1,
+                       deadline IS NOT NULL AND datetime(deadline) < datetime(updated_at, 'localtime'),
+                       (julianday(updated_at) - julianday(created_at)) * 24, 1
+                FROM (
+                    SELECT user_id, deadline, created_at, updated_at FROM tasks WHERE done = 1 AND auto_closed = 0
+                    UNION ALL
+                    SELECT user_id, deadline, created_at, updated_at FROM tasks_archive WHERE auto_closed = 0
+                )
+                UNION ALL
+                SELECT user_id, date(completed_at, 'localtime'), 0, 1,
+                       due_at IS NOT NULL AND datetime(due_at) < datetime(completed_at, 'localtime'), 0, 0
+                FROM task_completions WHERE auto = 0
+            )
+            WHERE day IS NOT NULL
+            GROUP BY user_id, day
+        """)
+    
+    def _advance_occurrence(self, task, occurrence, auto):
+        """Запись закрытого повторения и перенос задачи на следующее (без commit)"""
+        number, deadline = occurrence
+        self.cursor.execute("""
+            INSERT INTO task_completions (task_id, user_id, due_at, auto) 
+            VALUES (?, ?, ?, ?)
+        """, (task['id'], task['user_id'], task['deadline'], int(auto)))
+        self.task_cursor.execute(f"""
+            UPDATE tasks 
+            SET done = 0, deadline = ?, repeat_anchor = COALESCE(repeat_anchor, deadline), 
+                occurrence = ?, next_fire_at = ?, updated_at = CURRENT_TIMESTAMP 
+            WHERE id = ?
+            RETURNING {TASK_COLUMNS}
+        """, (deadline, number, compute_next_fire_at(deadline, task['reminder_offsets']), task['id']))
+        return self.task_cursor.fetchone()
+    
+    def _reschedule(self, task):
+        """Пересчёт next_fire_at задачи (без commit)"""
+        next_fire_at = None
+        if not task.done:
+            next_fire_at = compute_next_fire_at(task.deadline, task.reminder_offsets)
+        self.cursor.execute("UPDATE tasks SET next_fire_at = ? WHERE id = ?", (next_fire_at, task.id))
+    
     def add_task(self, user_id, text, deadline=None, category=None, priority=None, repeat=None):
         """Добавление новой задачи"""
         try:
             self.cursor.execute("""
-                INSERT INTO tasks (user_id, text, deadline, category, priority, repeat) 
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (user_id, text, deadline, category, priority, repeat))
-            self.conn.commit()
+                INSERT INTO tasks (user_id, text, deadline, category, priority, repeat, next_fire_at) 
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (user_id, text, deadline, category, priority, repeat, compute_next_fire_at(deadline)))
             task_id = self.cursor.lastrowid
+            self.conn.commit()
             logger.info(f"✅ Задача добавлена (ID: {task_id}) для пользователя {user_id}")
             return task_id
         except Exception as e:
+            self.conn.rollback()
             logger.error(f"❌ Ошибка при добавлении задачи: {e}")
             return None
     
-    def get_tasks(self, user_id, show_completed=False, category=None, priority=None):
-        """Получение задач пользователя с фильтрами"""
+    def add_tasks(self, user_id, tasks):
+        """Добавление нескольких задач одной транзакцией, возвращает их ID"""
+        if not tasks:
+            return []
         try:
-            query = """
-                SELECT id, text, done, deadline, category, priority, repeat, created_at 
-                FROM tasks 
-                WHERE user_id = ?
+            rows = [
+                (user_id, task["text"], task.get("deadline"), task.get("category"), task.get("priority"),
+                 task.get("repeat"), compute_next_fire_at(task.get("deadline")))
+                for task in tasks
+            ]
+            # Один многострочный INSERT вместо запроса и commit на каждую задачу
+            placeholders = ", ".join(["(?, ?, ?, ?, ?, ?, ?)"] * len(rows))
+            self.cursor.execute(f"""
+                INSERT INTO tasks (user_id, text, deadline, category, priority, repeat, next_fire_at) 
+                VALUES {placeholders}
+                RETURNING id
+            """, [value for row in rows for value in row])
+            task_ids = [row['id'] for row in self.cursor.fetchall()]
+            self.conn.commit()
+            logger.info(f"✅ Добавлено задач: {len(task_ids)} для пользователя {user_id}")
+            return sorted(task_ids)
+        except Exception as e:
+            self.conn.rollback()
+            logger.error(f"❌ Ошибка при добавлении задач: {e}")
+            return []
+    
+    def _tasks_query(self, user_id, show_completed=False, only_completed=False, category=None, priority=None,
+                     include_archive=False, with_deadline=False):
+        """Запрос задач пользователя с фильтрами (без сортировки) и его параметры"""
+        conditions = ""
+        params = [user_id]
+        
+        if only_completed:
+            # Выполненные пользователем: закрытые напоминанием ещё ждут подтверждения
+            conditions += " AND done = 1 AND auto_closed = 0"
+        elif not show_completed:
+            conditions += " AND done = 0"
+        
+        if with_deadline:
+            conditions += " AND deadline IS NOT NULL"
+        
+        if category:
+            conditions += " AND category = ?"
+            params.append(category)
+        
+        if priority:
+            conditions += " AND priority = ?"
+            params.append(priority)
+        
+        query = f"""
+            SELECT {TASK_COLUMNS} 
+            FROM tasks 
+            WHERE user_id = ?{conditions}
+        """
+        
+        # Архив содержит только выполненные задачи, читаем его лишь по запросу
+        if (show_completed or only_completed) and include_archive:
+            query = f"""
+                SELECT * FROM ({query}
+                UNION ALL
+                SELECT {ARCHIVE_TASK_COLUMNS} 
+                FROM tasks_archive 
+                WHERE user_id = ?{conditions})
             """
-            params = [user_id]
+            params = params * 2
+        
+        return query, params
+    
+    def get_tasks(self, user_id, limit=None, **filters):
+        """Получение задач пользователя с фильтрами (см. _tasks_query)"""
+        try:
+            query, params = self._tasks_query(user_id, **filters)
+            query += TASKS_ORDER
             
-            if not show_completed:
-                query += " AND done = 0"
+            if limit:
+                query += " LIMIT ?"
+                params.append(limit)
+            
+            self.task_cursor.execute(query, params)
+            return self.task_cursor.fetchall()
+        except Exception as e:
+            logger.error(f"❌ Ошибка при получении задач: {e}")
+            return []
+    
+    def count_tasks(self, user_id, **filters):
+        """Число задач пользователя с теми же фильтрами, что у get_tasks и iter_tasks"""
+        try:
+            query, params = self._tasks_query(user_id, **filters)
+            return self.cursor.execute(f"SELECT COUNT(*) FROM ({query})", params).fetchone()[0]
+        except Exception as e:
+            logger.error(f"❌ Ошибка при подсчёте задач: {e}")
+            return 0
+    
+    def iter_tasks(self, user_id, batch_size=500, **filters):
+        """Задачи пользователя потоком, пачками по batch_size, без списка всех строк в памяти.
+        
+        Фильтры и порядок — как у get_tasks (по умолчанию открытые задачи).
+        """
+        # Отдельный курсор: между пачками соединение могут использовать другие запросы
+        cursor = self.conn.cursor()
+        cursor.row_factory = task_factory
+        try:
+            query, params = self._tasks_query(user_id, **filters)
+            cursor.execute(query + TASKS_ORDER, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield from rows
+        except Exception as e:
+            logger.error(f"❌ Ошибка при получении задач: {e}")
+        finally:
+            cursor.close()
+    
+    def get_agenda(self, user_id, start=None, end=None, limit=100, auto_closed=False):
+        """Открытые задачи с дедлайном в [start, end) по возрастанию дедлайна.
+        
+        Границы — datetime; дедлайны хранятся в ISO-формате, поэтому сравнение строк
+        совпадает с сравнением дат и идёт по индексу idx_tasks_agenda.
+        auto_closed=True добавляет задачи, закрытые напоминанием и не подтверждённые пользователем.
+        """
+        try:
+            conditions = ""
+            params = [user_id]
             
-            if category:
-                query += " AND category = ?"
-                params.append(category)
+            if start:
+                conditions += " AND deadline >= ?"
+                params.append(start.isoformat())
+            else:
+                conditions += " AND deadline IS NOT NULL"
             
-            if priority:
-                query += " AND priority = ?"
-                params.append(priority)
+            if end:
+                conditions += " AND deadline < ?"
+                params.append(end.isoformat())
             
-            # Исправленный ORDER BY с правильным оформлением многострочной строки
-            query += """ ORDER BY 
-                CASE priority 
-                    WHEN 'Высокий' THEN 1
-                    WHEN 'Средний' THEN 2
-                    WHEN 'Низкий' THEN 3
-                    ELSE 4
-                END,
-                deadline ASC
+            query = f"""
+                SELECT {TASK_COLUMNS} 
+                FROM tasks 
+                WHERE user_id = ? AND done = 0{conditions}
             """
             
-            self.cursor.execute(query, params)
-            return self.cursor.fetchall()
+            if auto_closed:
+                query += f"""
+                    UNION ALL
+                    SELECT {TASK_COLUMNS} 
+                    FROM tasks 
+                    WHERE user_id = ? AND auto_closed = 1{conditions}
+                """
+                params = params * 2
+            
+            params.append(limit)
+            self.task_cursor.execute(query + " ORDER BY deadline LIMIT ?", params)
+            return self.task_cursor.fetchall()
         except Exception as e:
-            logger.error(f"❌ Ошибка при получении задач: {e}")
+            logger.error(f"❌ Ошибка при получении повестки: {e}")
             return []
     
-    def get_task(self, task_id):
-        """Получение конкретной задачи по ID"""
+    def get_task(self, task_id, user_id):
+        """Получение конкретной задачи пользователя по ID"""
         try:
-            self.cursor.execute("SELECT * FROM tasks WHERE id = ?", (task_id,))
-            return self.cursor.fetchone()
+            self.task_cursor.execute(f"SELECT {TASK_COLUMNS} FROM tasks WHERE id = ? AND user_id = ?", (task_id, user_id))
+            return self.task_cursor.fetchone()
         except Exception as e:
             logger.error(f"❌ Ошибка при получении задачи {task_id}: {e}")
             return None
     
-    def mark_done(self, task_id):
-        """Отметка задачи как выполненной"""
+    def _mutate_task(self, query, params, reschedule=False):
+        """Выполнение изменения с RETURNING: возвращает затронутую задачу или None"""
+        self.task_cursor.execute(query, params)
+        row = self.task_cursor.fetchone()
+        if row and reschedule:
+            self._reschedule(row)
+        self.conn.commit()
+        return row
+    
+    def _mutate_many(self, query, params):
+        """Выполнение изменения с RETURNING: возвращает все затронутые строки"""
+        self.cursor.execute(query, params)
+        rows = self.cursor.fetchall()
+        self.conn.commit()
+        return rows
+    
+    def mark_done(self, task_id, user_id):
+        """Отметка задачи как выполненной (повторяющаяся переносится на следующий срок)"""
         try:
-            self.cursor.execute("""
+            self.task_cursor.execute(f"""
                 UPDATE tasks 
-                SET done = 1, updated_at = CURRENT_TIMESTAMP 
-                WHERE id = ?
-            """, (task_id,))
+                SET done = 1, auto_closed = 0, next_fire_at = NULL, updated_at = CURRENT_TIMESTAMP 
+                WHERE id = ? AND user_id = ?
+                RETURNING {TASK_COLUMNS}
+            """, (task_id, user_id))
+            task = self.task_cursor.fetchone()
+            
+            occurrence = next_task_occurrence(task) if task else None
+            if occurrence:
+                task = self._advance_occurrence(task, occurrence, auto=False)
+            
             self.conn.commit()
-            logger.info(f"✅ Задача {task_id} отмечена как выполненная")
-            return True
+            if task:
+                logger.info(f"✅ Задача {task_id} отмечена как выполненная")
+            return task
         except Exception as e:
+            self.conn.rollback()
             logger.error(f"❌ Ошибка при отметке задачи {task_id}: {e}")
-            return False
+            return None
     
-    def mark_undone(self, task_id):
+    def mark_undone(self, task_id, user_id):
         """Отметка задачи как невыполненной"""
         try:
-            self.cursor.execute("""
+            task = self._mutate_task(f"""
                 UPDATE tasks 
-                SET done = 0, updated_at = CURRENT_TIMESTAMP 
-                WHERE id = ?
-            """, (task_id,))
-            self.conn.commit()
-            logger.info(f"✅ Задача {task_id} отмечена как невыполненная")
-            return True
+                SET done = 0, auto_closed = 0, updated_at = CURRENT_TIMESTAMP 
+                WHERE id = ? AND user_id = ?
+                RETURNING {TASK_COLUMNS}
+            """, (task_id, user_id), reschedule=True)
+            if task:
+                logger.info(f"✅ Задача {task_id} отмечена как невыполненная")
+            return task
         except Exception as e:
             logger.error(f"❌ Ошибка при отметке задачи {task_id}: {e}")
-            return False
+            return None
     
-    def delete_task(self, task_id):
+    def delete_task(self, task_id, user_id):
         """Удаление задачи"""
         try:
-            self.cursor.execute("DELETE FROM tasks WHERE id = ?", (task_id,))
-            self.conn.commit()
-            logger.info(f"✅ Задача {task_id} удалена")
-            return True
+            task = self._mutate_task(f"""
+                DELETE FROM tasks 
+                WHERE id = ? AND user_id = ?
+                RETURNING {TASK_COLUMNS}
+            """, (task_id, user_id))
+            if task:
+                logger.info(f"✅ Задача {task_id} удалена")
+            return task
         except Exception as e:
             logger.error(f"❌ Ошибка при удалении задачи {task_id}: {e}")
-            return False
+            return None
     
-    def update_task(self, task_id, **kwargs):
+    def update_task(self, task_id, user_id, **kwargs):
         """Обновление задачи"""
         try:
             if not kwargs:
-                return False
+                return None
+            
+            # Новый дедлайн или правило повторения — отсчёт повторений начинается заново
+            if "deadline" in kwargs or "repeat" in kwargs:
+                kwargs.update(repeat_anchor=None, occurrence=0)
             
             set_clause = ", ".join([f"{key} = ?" for key in kwargs.keys()])
             values = list(kwargs.values())
-            values.append(task_id)
+            values.extend([task_id, user_id])
             
             query = f"""
                 UPDATE tasks 
                 SET {set_clause}, updated_at = CURRENT_TIMESTAMP 
-                WHERE id = ?
+                WHERE id = ? AND user_id = ?
+                RETURNING {TASK_COLUMNS}
             """
             
-            self.cursor.execute(query, values)
-            self.conn.commit()
-            logger.info(f"✅ Задача {task_id} обновлена")
-            return True
+            # Смена дедлайна или смещений требует пересчёта ближайшего напоминания
+            reschedule = "deadline" in kwargs or "reminder_offsets" in kwargs
+            task = self._mutate_task(query, values, reschedule=reschedule)
+            if task:
+                logger.info(f"✅ Задача {task_id} обновлена")
+            return task
         except Exception as e:
             logger.error(f"❌ Ошибка при обновлении задачи {task_id}: {e}")
-            return False
+            return None
     
-    def get_tasks_with_deadline(self):
-        """Получение задач с дедлайном"""
+    def get_due_reminders(self, now, limit=100):
+        """Получение задач, напоминание по которым пора отправить"""
         try:
             self.cursor.execute("""
-                SELECT id, user_id, text, deadline, repeat 
+                SELECT id, user_id, text, deadline, repeat, reminder_offsets, next_fire_at, 
+                       repeat_anchor, occurrence 
                 FROM tasks 
-                WHERE done = 0 AND deadline IS NOT NULL
-                ORDER BY deadline ASC
-            """)
+                WHERE next_fire_at <= ?
+                ORDER BY next_fire_at ASC
+                LIMIT ?
+            """, (now, limit))
             return self.cursor.fetchall()
         except Exception as e:
-            logger.error(f"❌ Ошибка при получении задач с дедлайном: {e}")
+            logger.error(f"❌ Ошибка при получении наступивших напоминаний: {e}")
+            return []
+    
+    def enqueue_reminders(self, items):
+        """Атомарно: напоминание в очереди + продвижение задачи.
+        
+        items — список кортежей (задача, вид, следующий next_fire_at, следующее повторение).
+        Вид 'before' сдвигает next_fire_at, 'deadline' закрывает задачу с пометкой auto_closed,
+        'repeat' закрывает текущее повторение и переносит задачу на следующий срок.
+        """
+        try:
+            queued = 0
+            with self.conn:
+                for task, kind, next_fire_at, occurrence in items:
+                    # Сдвигаем, только если задачу не изменили между выборкой и транзакцией
+                    if kind == "before":
+                        self.cursor.execute("""
+                            UPDATE tasks SET next_fire_at = ? 
+                            WHERE id = ? AND next_fire_at = ?
+                            RETURNING id
+                        """, (next_fire_at, task['id'], task['next_fire_at']))
+                    else:
+                        self.cursor.execute("""
+                            UPDATE tasks 
+                            SET done = ?, auto_closed = ?, next_fire_at = NULL, updated_at = CURRENT_TIMESTAMP 
+                            WHERE id = ? AND next_fire_at = ?
+                            RETURNING id
+                        """, (int(kind == "deadline"), int(kind == "deadline"), task['id'], task['next_fire_at']))
+                    if not self.cursor.fetchone():
+                        continue
+                    
+                    if kind == "repeat":
+                        self._advance_occurrence(task, occurrence, auto=True)
+                    
+                    self.cursor.execute("""
+                        INSERT INTO reminder_outbox (task_id, user_id, text, deadline, kind, next_deadline) 
+                        VALUES (?, ?, ?, ?, ?, ?)
+                    """, (task['id'], task['user_id'], task['text'], task['deadline'], kind,
+                          occurrence[1] if occurrence else None))
+                    
+                    queued += 1
+            return queued
+        except Exception as e:
+            logger.error(f"❌ Ошибка при постановке напоминаний в очередь: {e}")
+            return 0
+    
+    def claim_reminders(self, limit=100, lease_seconds=300):
+        """Захват пачки напоминаний к отправке (аренда истекает, если отправитель упал)"""
+        try:
+            now = time.time()
+            rows = self._mutate_many("""
+                UPDATE reminder_outbox 
+                SET claimed_until = ?, attempts = attempts + 1 
+                WHERE id IN (
+                    SELECT id FROM reminder_outbox 
+                    WHERE claimed_until IS NULL OR claimed_until < ?
+                    ORDER BY id 
+                    LIMIT ?
+                )
+                RETURNING id, task_id, user_id, text, deadline, kind, next_deadline, attempts
+            """, (now + lease_seconds, now, limit))
+            return sorted(rows, key=lambda row: row['id'])
+        except Exception as e:
+            logger.error(f"❌ Ошибка при захвате напоминаний: {e}")
             return []
     
-    def search_tasks(self, user_id, keyword):
+    def ack_reminder(self, reminder_id):
+        """Подтверждение отправки: напоминание удаляется из очереди"""
+        try:
+            self.cursor.execute("DELETE FROM reminder_outbox WHERE id = ?", (reminder_id,))
+            self.conn.commit()
+            return True
+        except Exception as e:
+            logger.error(f"❌ Ошибка при подтверждении напоминания {reminder_id}: {e}")
+            return False
+    
+    def search_tasks(self, user_id, keyword, include_archive=False):
         """Поиск задач по ключевому слову"""
         try:
-            self.cursor.execute("""
-                SELECT id, text, done, deadline, category, priority, repeat 
+            query = f"""
+                SELECT {TASK_COLUMNS} 
                 FROM tasks 
                 WHERE user_id = ? AND text LIKE ?
-                ORDER BY 
-                    CASE priority 
-                        WHEN 'Высокий' THEN 1
-                        WHEN 'Средний' THEN 2
-                        WHEN 'Низкий' THEN 3
-                        ELSE 4
-                    END,
-                    deadline ASC
-            """, (user_id, f"%{keyword}%"))
-            return self.cursor.fetchall()
+            """
+            params = [user_id, f"%{keyword}%"]
+            
+            if include_archive:
+                query = f"""
+                    SELECT * FROM ({query}
+                    UNION ALL
+                    SELECT {ARCHIVE_TASK_COLUMNS} 
+                    FROM tasks_archive 
+                    WHERE user_id = ? AND text LIKE ?)
+                """
+                params = params * 2
+            
+            query += """ ORDER BY 
+                CASE priority 
+                    WHEN 'Высокий' THEN 1
+                    WHEN 'Средний' THEN 2
+                    WHEN 'Низкий' THEN 3
+                    ELSE 4
+                END,
+                deadline ASC
+            """
+            
+            self.task_cursor.execute(query, params)
+            return self.task_cursor.fetchall()
+        except Exception as e:
+            logger.error(f"❌ Ошибка при поиске задач: {e}")
+            return []
+    
+    def search_tasks_prefix(self, user_id, text, limit=50):
+        """Поиск по началам слов через полнотекстовый индекс: открытые задачи первыми"""
+        try:
+            # Каждое слово запроса — префикс; кавычки защищают от синтаксиса FTS5
+            text = text.replace("ё", "е").replace("Ё", "Е")
+            terms = [f'"{word.replace(chr(34), chr(34) * 2)}"*' for word in text.split()]
+            if not terms:
+                return []
+            match = f'owner : "u{int(user_id)}" AND ' + " AND ".join(f"text : {term}" for term in terms)
+            
+            columns = ", ".join(f"t.{column.strip()}" for column in TASK_COLUMNS.split(","))
+            self.task_cursor.execute(f"""
+                SELECT {columns} 
+                FROM tasks_fts 
+                JOIN tasks t ON t.id = tasks_fts.rowid 
+                WHERE tasks_fts MATCH ? 
+                ORDER BY t.done, tasks_fts.rank 
+                LIMIT ?
+            """, (match, limit))
+            return self.task_cursor.fetchall()
         except Exception as e:
             logger.error(f"❌ Ошибка при поиске задач: {e}")
             return []
     
-    def get_user_stats(self, user_id):
+    def last_user_change(self, user_id):
+        """Номер последнего изменения задач пользователя в журнале (0, если изменений нет)"""
+        try:
+            row = self.cursor.execute("SELECT MAX(seq) FROM task_changes WHERE user_id = ?", (user_id,)).fetchone()
+            return row[0] or 0
+        except Exception as e:
+            logger.error(f"❌ Ошибка при чтении журнала изменений: {e}")
+            return 0
+    
+    def get_user_stats(self, user_id, include_archive=False):
         """Получение статистики пользователя"""
         try:
             self.cursor.execute("""
                 SELECT 
                     COUNT(*) as total,
-                    SUM(CASE WHEN done = 1 THEN 1 ELSE 0 END) as completed,
-                    COUNT(CASE WHEN deadline IS NOT NULL 
-                              AND datetime(deadline) < datetime('now') 
-                              AND done = 0 THEN 1 END) as overdue,
+                    SUM(CASE WHEN done = 1 AND auto_closed = 0 THEN 1 ELSE 0 END) as completed,
+                    COUNT(CASE WHEN (deadline IS NOT NULL 
+                                   AND datetime(deadline) < datetime('now') 
+                                   AND done = 0) OR auto_closed = 1 THEN 1 END) as overdue,
                     COUNT(CASE WHEN priority = 'Высокий' AND done = 0 THEN 1 END) as high_priority,
                     COUNT(CASE WHEN category IS NOT NULL THEN 1 END) as with_category
                 FROM tasks 
                 WHERE user_id = ?
             """, (user_id,))
             result = self.cursor.fetchone()
-            return dict(result) if result else {}
+            stats = dict(result) if result else {}
+            
+            if stats:
+                # Закрытые повторения считаются задачами, выполненными — только закрытые пользователем
+                self.cursor.execute("""
+                    SELECT COUNT(*) AS closed, COUNT(CASE WHEN auto = 0 THEN 1 END) AS completed 
+                    FROM task_completions WHERE user_id = ?
+                """, (user_id,))
+                closed = self.cursor.fetchone()
+                stats['total'] += closed['closed']
+                stats['completed'] = (stats['completed'] or 0) + closed['completed']
+            
+            if stats and include_archive:
+                # В архиве только выполненные задачи: просроченных и открытых там нет
+                self.cursor.execute("""
+                    SELECT 
+                        COUNT(*) as total,
+                        COUNT(CASE WHEN auto_closed = 0 THEN 1 END) as completed,
+                        COUNT(CASE WHEN category IS NOT NULL THEN 1 END) as with_category
+                    FROM tasks_archive 
+                    WHERE user_id = ?
+                """, (user_id,))
+                archived = self.cursor.fetchone()
+                stats['total'] += archived['total']
+                stats['completed'] = (stats['completed'] or 0) + archived['completed']
+                stats['with_category'] += archived['with_category']
+            
+            return stats
         except Exception as e:
             logger.error(f"❌ Ошибка при получении статистики: {e}")
             return {}
     
-    def get_user_categories(self, user_id):
-        """Получение уникальных категорий пользователя"""
+    def get_period_stats(self, user_id, days, shift=0):
+        """Итоги за days дней, закончившихся shift дней назад (по дневным итогам, без сканирования задач)"""
         try:
             self.cursor.execute("""
-                SELECT DISTINCT category 
-                FROM tasks 
-                WHERE user_id = ? AND category IS NOT NULL AND category != ''
-            """, (user_id,))
+                SELECT 
+                    COALESCE(SUM(created), 0) AS created,
+                    COALESCE(SUM(completed), 0) AS completed,
+                    COALESCE(SUM(completed_late), 0) AS completed_late,
+                    COALESCE(SUM(lead_hours), 0) AS lead_hours,
+                    COALESCE(SUM(lead_count), 0) AS lead_count
+                FROM daily_stats 
+                WHERE user_id = ? 
+                  AND day > date('now', 'localtime', ?) 
+                  AND day <= date('now', 'localtime', ?)
+            """, (user_id, f"-{int(days) + int(shift)} days", f"-{int(shift)} days"))
+            return dict(self.cursor.fetchone())
+        except Exception as e:
+            logger.error(f"❌ Ошибка при получении итогов за период: {e}")
+            return None
+    
+    def get_weekly_stats(self, user_id, weeks=12):
+        """Итоги по неделям (неделя — дата её понедельника) за последние weeks недель"""
+        try:
+            self.cursor.execute("""
+                SELECT 
+                    date(day, '-6 days', 'weekday 1') AS week,
+                    SUM(created) AS created,
+                    SUM(completed) AS completed,
+                    SUM(completed_late) AS completed_late
+                FROM daily_stats 
+                WHERE user_id = ? AND day >= date('now', 'localtime', '-6 days', 'weekday 1', ?)
+                GROUP BY week
+                ORDER BY week
+            """, (user_id, f"-{7 * (int(weeks) - 1)} days"))
+            return self.cursor.fetchall()
+        except Exception as e:
+            logger.error(f"❌ Ошибка при получении итогов по неделям: {e}")
+            return []
+    
+    def get_completion_days(self, user_id, days=366):
+        """Дни с хотя бы одной выполненной задачей за последние days дней, от новых к старым"""
+        try:
+            self.cursor.execute("""
+                SELECT day FROM daily_stats 
+                WHERE user_id = ? AND day > date('now', 'localtime', ?) AND completed > 0
+                ORDER BY day DESC
+            """, (user_id, f"-{int(days)} days"))
+            return [row[0] for row in self.cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"❌ Ошибка при получении дней активности: {e}")
+            return []
+    
+    def get_calendar_version(self, user_id):
+        """Версия задач пользователя: последний номер в журнале изменений и время последних правок"""
+        try:
+            self.cursor.execute("""
+                SELECT 
+                    (SELECT MAX(seq) FROM task_changes WHERE user_id = ?) AS seq,
+                    (SELECT changed_at FROM task_changes WHERE user_id = ? ORDER BY seq DESC LIMIT 1) AS changed_at,
+                    (SELECT MAX(updated_at) FROM tasks WHERE user_id = ?) AS updated_at
+            """, (user_id, user_id, user_id))
+            return dict(self.cursor.fetchone())
+        except Exception as e:
+            logger.error(f"❌ Ошибка при получении версии календаря: {e}")
+            return None
+    
+    def get_category_key(self, user_id, name):
+        """Постоянный ключ категории (rowid) для кнопок, в которые не помещается имя"""
+        try:
+            row = self.cursor.execute(
+                "SELECT rowid FROM categories WHERE user_id = ? AND name = ?", (user_id, name)
+            ).fetchone()
+            return row[0] if row else None
+        except Exception as e:
+            logger.error(f"❌ Ошибка при получении ключа категории: {e}")
+            return None
+    
+    def find_category(self, user_id, name=None, key=None):
+        """Имя категории пользователя по имени или ключу, если она ещё используется, иначе None"""
+        try:
+            column, value = ("name", name) if key is None else ("rowid", key)
+            row = self.cursor.execute(
+                f"SELECT name FROM categories WHERE user_id = ? AND {column} = ? AND usage_count > 0",
+                (user_id, value)
+            ).fetchone()
+            return row[0] if row else None
+        except Exception as e:
+            logger.error(f"❌ Ошибка при поиске категории: {e}")
+            return None
+    
+    def get_user_categories(self, user_id, limit=None, offset=0):
+        """Категории пользователя, самые используемые первыми"""
+        try:
+            self.cursor.execute("""
+                SELECT name FROM categories 
+                WHERE user_id = ? AND usage_count > 0 
+                ORDER BY usage_count DESC, last_used_at DESC 
+                LIMIT ? OFFSET ?
+            """, (user_id, -1 if limit is None else limit, offset))
             return [row[0] for row in self.cursor.fetchall()]
         except Exception as e:
             logger.error(f"❌ Ошибка при получении категорий: {e}")
             return []
     
+    def archive_completed_tasks(self, older_than_days=30, batch_size=500):
+        """Перенос одной пачки выполненных задач в архив, возвращает число перенесённых"""
+        try:
+            with self.conn:
+                self.cursor.execute("""
+                    SELECT id FROM tasks 
+                    WHERE done = 1 AND auto_closed = 0 AND updated_at < datetime('now', ?)
+                    LIMIT ?
+                """, (f"-{int(older_than_days)} days", batch_size))
+                ids = [row[0] for row in self.cursor.fetchall()]
+                
+                if not ids:
+                    return 0
+                
+                placeholders = ", ".join("?" * len(ids))
+                self.cursor.execute(f"""
+                    INSERT OR REPLACE INTO tasks_archive 
+                        (id, user_id, text, done, deadline, category, priority, repeat, created_at, updated_at, auto_closed)
+                    SELECT id, user_id, text, done, deadline, category, priority, repeat, created_at, updated_at, auto_closed
+                    FROM tasks WHERE id IN ({placeholders})
+                """, ids)
+                self.cursor.execute(f"DELETE FROM tasks WHERE id IN ({placeholders})", ids)
+            
+            logger.info(f"📦 В архив перенесено задач: {len(ids)}")
+            return len(ids)
+        except Exception as e:
+            logger.error(f"❌ Ошибка при архивации задач: {e}")
+            return 0
+    
+    def changes_since(self, seq, limit=1000, user_id=None):
+        """Изменения задач с номером больше seq (по возрастанию).
+        
+        Возвращает словарь: changes — строки (seq, user_id, task_id, op, changed_at),
+        last_seq — номер, с которого читать дальше, truncated — нужные записи уже
+        удалены сжатием журнала, и читателю надо перечитать данные целиком.
+        """
+        try:
+            user_filter = "AND user_id = ?" if user_id is not None else ""
+            params = [seq] + ([user_id] if user_id is not None else []) + [limit]
+            self.cursor.execute(f"""
+                SELECT seq, user_id, task_id, op, changed_at FROM task_changes 
+                WHERE seq > ? {user_filter}
+                ORDER BY seq 
+                LIMIT ?
+            """, params)
+            changes = self.cursor.fetchall()
+            
+            oldest = self.cursor.execute("SELECT MIN(seq) FROM task_changes").fetchone()[0]
+            return {
+                "changes": changes,
+                "last_seq": changes[-1]['seq'] if changes else max(seq, self.last_change_seq()),
+                "truncated": oldest is not None and seq < oldest - 1,
+            }
+        except Exception as e:
+            logger.error(f"❌ Ошибка при чтении журнала изменений: {e}")
+            return None
+    
+    def last_change_seq(self):
+        """Номер последнего изменения (0, если изменений ещё не было)"""
+        try:
+            row = self.cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'task_changes'").fetchone()
+            return row[0] if row else 0
+        except Exception as e:
+            logger.error(f"❌ Ошибка при чтении журнала изменений: {e}")
+            return 0
+    
+    def compact_changes(self, keep=100000):
+        """Сжатие журнала изменений до keep последних записей, возвращает число удалённых"""
+        try:
+            self.cursor.execute("DELETE FROM task_changes WHERE seq <= ?", (self.last_change_seq() - keep,))
+            removed = self.cursor.rowcount
+            self.conn.commit()
+            if removed:
+                logger.info(f"🗜 Журнал изменений сжат, удалено записей: {removed}")
+            return removed
+        except Exception as e:
+            logger.error(f"❌ Ошибка при сжатии журнала изменений: {e}")
+            return 0
+    
+    def ping(self):
+        """Проверка доступности базы"""
+        try:
+            return self.cursor.execute("SELECT 1").fetchone()[0] == 1
+        except Exception as e:
+            logger.error(f"❌ База данных недоступна: {e}")
+            return False
+    
+    def get_reminder_backlog(self, now):
+        """Отставание напоминаний: наступивших, самое раннее из них (epoch) и ожидающих отправки"""
+        try:
+            due, oldest = self.cursor.execute("""
+                SELECT COUNT(*), MIN(next_fire_at) FROM tasks WHERE next_fire_at <= ?
+            """, (now,)).fetchone()
+            outbox = self.cursor.execute("SELECT COUNT(*) FROM reminder_outbox").fetchone()[0]
+            return {"due": due, "oldest_due": oldest, "outbox": outbox}
+        except Exception as e:
+            logger.error(f"❌ Ошибка при получении очереди напоминаний: {e}")
+            return None
+    
+    def storage_stats(self):
+        """Размер файла базы: страниц всего, свободных страниц, байт"""
+        try:
+            page_size = self.cursor.execute("PRAGMA page_size").fetchone()[0]
+            page_count = self.cursor.execute("PRAGMA page_count").fetchone()[0]
+            free_pages = self.cursor.execute("PRAGMA freelist_count").fetchone()[0]
+            return {"pages": page_count, "free_pages": free_pages, "bytes": page_count * page_size}
+        except Exception as e:
+            logger.error(f"❌ Ошибка при получении размера базы: {e}")
+            return None
+    
+    def query_plan(self, query, params=()):
+        """План выполнения запроса (EXPLAIN QUERY PLAN) списком строк"""
+        try:
+            self.cursor.execute(f"EXPLAIN QUERY PLAN {query}", params)
+            return [row['detail'] for row in self.cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"❌ Ошибка при получении плана запроса: {e}")
+            return []
+    
+    def analyze(self, analysis_limit=400):
+        """Обновление статистики планировщика (ANALYZE с ограничением на число строк индекса)"""
+        try:
+            self.cursor.execute(f"PRAGMA analysis_limit = {int(analysis_limit)}")
+            self.cursor.execute("ANALYZE")
+            self.conn.commit()
+            return True
+        except Exception as e:
+            logger.error(f"❌ Ошибка при выполнении ANALYZE: {e}")
+            return False
+    
+    def optimize(self):
+        """PRAGMA optimize: пересчёт статистики там, где она устарела"""
+        try:
+            self.cursor.execute("PRAGMA optimize")
+            self.conn.commit()
+            return True
+        except Exception as e:
+            logger.error(f"❌ Ошибка при выполнении PRAGMA optimize: {e}")
+            return False
+    
+    def checkpoint(self):
+        """Перенос WAL в основной файл; в режиме журнала отката ничего не делает"""
+        try:
+            mode = self.cursor.execute("PRAGMA journal_mode").fetchone()[0]
+            if mode != "wal":
+                return None
+            return tuple(self.cursor.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone())
+        except Exception as e:
+            logger.error(f"❌ Ошибка при выполнении wal_checkpoint: {e}")
+            return None
+    
+    def incremental_vacuum(self, pages):
+        """Освобождение до pages свободных страниц, возвращает число освобождённых"""
+        try:
+            before = self.cursor.execute("PRAGMA freelist_count").fetchone()[0]
+            # Каждый шаг оператора освобождает одну страницу: executescript выполняет его до конца
+            self.conn.commit()
+            self.conn.executescript(f"PRAGMA incremental_vacuum({int(pages)});")
+            return before - self.cursor.execute("PRAGMA freelist_count").fetchone()[0]
+        except Exception as e:
+            logger.error(f"❌ Ошибка при выполнении incremental_vacuum: {e}")
+            return 0
+    
+    def auto_vacuum_mode(self):
+        """Режим auto_vacuum: 0 — выключен, 1 — полный, 2 — инкрементальный"""
+        try:
+            return self.cursor.execute("PRAGMA auto_vacuum").fetchone()[0]
+        except Exception as e:
+            logger.error(f"❌ Ошибка при получении режима auto_vacuum: {e}")
+            return None
+    
+    def enable_incremental_vacuum(self):
+        """Перевод существующей базы в режим auto_vacuum=INCREMENTAL (полный VACUUM).
+        
+        VACUUM идёт в собственном соединении, поэтому метод можно вызывать из рабочего потока,
+        не занимая общее соединение бота.
+        """
+        conn = None
+        try:
+            started = time.monotonic()
+            conn = sqlite3.connect(self.db_name)
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+            logger.info(f"🧹 База переведена в режим auto_vacuum=INCREMENTAL за {time.monotonic() - started:.2f} с")
+            return True
+        except Exception as e:
+            logger.error(f"❌ Ошибка при переводе базы в auto_vacuum=INCREMENTAL: {e}")
+            return False
+        finally:
+            if conn:
+                conn.close()
+    
     def close(self):
         """Закрытие соединения с базой данных"""
-        self.conn.close()
+        if self.conn:
+            self.conn.close()
+            self.conn = None
+            self.cursor = None
 
-# Создаем глобальный экземпляр базы данных
+# Глобальный экземпляр базы данных (соединение открывается в db.connect())
 db = Database()
\ No newline at end of file
@@ -0,0 +1,150 @@
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+
+from aiohttp import web
+
+from db_handler import db
+from reminders import reminder_status
+from config import (
+    HEALTH_HOST,
+    HEALTH_PORT,
+    LOOP_LAG_INTERVAL,
+    LOOP_LAG_THRESHOLD,
+    READY_POLLING_STALE,
+    READY_REMINDER_DELAY,
+)
+import logging
+
+logger = logging.getLogger(__name__)
+
+class LoopMonitor:
+    """Измерение задержки цикла событий и сторожевой поток, снимающий стек при зависании.
+    
+    Корутина run() раз в interval засыпает и измеряет, насколько позже проснулась.
+    Если цикл заблокирован дольше threshold, сторожевой поток логирует стек потока
+    цикла — там видна синхронная функция или корутина, которая его держит.
+    """
+    
+    def __init__(self, interval=0.25, threshold=1.0, window=1200):
+        self.interval = interval
+        self.threshold = threshold
+        self.stalls = 0
+        self.max_lag = 0.0
+        self._lags = deque(maxlen=window)
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id = None
+        self._watchdog = None
+    
+    async def run(self):
+        """Измерение задержки цикла событий"""
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        if self._watchdog is None:
+            self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._watchdog.start()
+        
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._heartbeat = now
+            
+            lag = now - started - self.interval
+            self._lags.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+            if lag > self.threshold:
+                logger.warning(f"🐢 Цикл событий был заблокирован на {lag * 1000:.0f} мс")
+    
+    def _watch(self):
+        """Сторожевой поток: один снимок стека на каждое зависание"""
+        reported = False
+        while True:
+            time.sleep(self.interval)
+            stalled = time.monotonic() - self._heartbeat - self.interval
+            
+            if stalled <= self.threshold:
+                reported = False
+                continue
+            if reported:
+                continue
+            
+            reported = True
+            self.stalls += 1
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame else "стек недоступен\n"
+            logger.warning(f"🧊 Цикл событий не отвечает {stalled:.1f} с, стек потока цикла:\n{stack}")
+    
+    def snapshot(self):
+        """Текущие значения задержки (мс)"""
+        lags = sorted(self._lags)
+        
+        def percentile(p):
+            return lags[min(int(len(lags) * p), len(lags) - 1)] * 1000 if lags else 0.0
+        
+        return {
+            "lag_p50_ms": percentile(0.5),
+            "lag_p99_ms": percentile(0.99),
+            "lag_max_ms": self.max_lag * 1000,
+            "stalls": self.stalls,
+        }
+
+loop_monitor = LoopMonitor(LOOP_LAG_INTERVAL, LOOP_LAG_THRESHOLD)
+
+def readiness_checks(bot):
+    """Проверки готовности: опрос обновлений, база данных, отставание напоминаний"""
+    now = time.time()
+    checks = {}
+    
+    last_poll = bot.session.stats.last_success.get("getUpdates")
+    checks["polling"] = {
+        "ok": last_poll is not None and now - last_poll < READY_POLLING_STALE,
+        "last_success_ago": round(now - last_poll, 1) if last_poll else None,
+    }
+    
+    checks["database"] = {"ok": db.ping()}
+    
+    backlog = db.get_reminder_backlog(int(now))
+    last_cycle = reminder_status["last_cycle_at"]
+    delay = now - backlog["oldest_due"] if backlog and backlog["oldest_due"] else 0
+    checks["reminders"] = {
+        "ok": backlog is not None and delay < READY_REMINDER_DELAY,
+        "delay": round(delay, 1),
+        "due": backlog["due"] if backlog else None,
+        "outbox": backlog["outbox"] if backlog else None,
+        "last_cycle_ago": round(now - last_cycle, 1) if last_cycle else None,
+    }
+    
+    return checks
+
+async def healthz(request):
+    """Живость: раз обработчик выполняется, цикл событий отвечает"""
+    return web.json_response({"status": "ok", "loop": loop_monitor.snapshot()})
+
+async def readyz(request):
+    """Готовность к обработке обновлений; 503, если хоть одна проверка не прошла"""
+    checks = readiness_checks(request.app["bot"])
+    ready = all(check["ok"] for check in checks.values())
+    return web.json_response(
+        {"status": "ready" if ready else "not ready", "checks": checks},
+        status=200 if ready else 503
+    )
+
+def create_app(bot):
+    """HTTP-приложение со служебными эндпоинтами"""
+    app = web.Application()
+    app["bot"] = bot
+    app.router.add_get("/healthz", healthz)
+    app.router.add_get("/readyz", readyz)
+    return app
+
+async def start_server(app, host=HEALTH_HOST, port=HEALTH_PORT):
+    """Запуск HTTP-сервера, возвращает runner для остановки"""
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"🩺 HTTP-проверки состояния: http://{host}:{port}/healthz, /readyz")
+    return runner
\ No newline at end of file
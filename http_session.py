@@ -0,0 +1,136 @@
+import time
+import logging
+from collections import defaultdict, deque
+
+from aiohttp import ClientSession, TraceConfig
+from aiohttp.hdrs import USER_AGENT
+from aiohttp.http import SERVER_SOFTWARE
+from aiogram import __version__
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+
+from config import (
+    BOT_API_URL,
+    SESSION_POOL_LIMIT,
+    SESSION_KEEPALIVE,
+    SESSION_DNS_TTL,
+    SESSION_TIMEOUT,
+    SESSION_METHOD_TIMEOUTS,
+)
+
+logger = logging.getLogger(__name__)
+
+class SessionStats:
+    """Статистика HTTP-сессии: переиспользование соединений и задержки запросов"""
+    
+    def __init__(self, window=1000):
+        self.connections_created = 0
+        self.connections_reused = 0
+        self.errors = 0
+        self.last_success = {}  # метод -> время последнего успешного запроса
+        self._latencies = defaultdict(lambda: deque(maxlen=window))  # метод -> последние задержки
+        self._counts = defaultdict(int)
+    
+    def observe(self, method, latency):
+        """Учёт одного запроса к Bot API (сек)"""
+        self._counts[method] += 1
+        self._latencies[method].append(latency)
+    
+    def snapshot(self):
+        """Текущие значения статистики (время в мс)"""
+        connections = self.connections_created + self.connections_reused
+        methods = {}
+        for method, latencies in self._latencies.items():
+            ordered = sorted(latencies)
+            methods[method] = {
+                "count": self._counts[method],
+                "avg_ms": sum(ordered) / len(ordered) * 1000,
+                "p95_ms": ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)] * 1000,
+                "max_ms": ordered[-1] * 1000,
+            }
+        
+        return {
+            "connections_created": self.connections_created,
+            "connections_reused": self.connections_reused,
+            "reuse_ratio": self.connections_reused / connections if connections else 0.0,
+            "errors": self.errors,
+            "methods": methods,
+        }
+
+class TunedAiohttpSession(AiohttpSession):
+    """Сессия Bot API с настроенным пулом соединений, таймаутами по методам и статистикой.
+    
+    getUpdates получает таймаут от диспетчера (timeout сессии + polling_timeout),
+    остальные методы — из method_timeouts или общий timeout сессии.
+    """
+    
+    def __init__(self, limit=100, keepalive_timeout=60, dns_ttl=3600, method_timeouts=None, **kwargs):
+        super().__init__(limit=limit, **kwargs)
+        self._connector_init.update(
+            limit_per_host=limit,
+            keepalive_timeout=keepalive_timeout,
+            ttl_dns_cache=dns_ttl,
+        )
+        self.method_timeouts = method_timeouts or {}
+        self.stats = SessionStats()
+    
+    async def create_session(self):
+        if self._should_reset_connector:
+            await self.close()
+        
+        if self._session is None or self._session.closed:
+            self._session = ClientSession(
+                connector=self._connector_type(**self._connector_init),
+                headers={
+                    USER_AGENT: f"{SERVER_SOFTWARE} aiogram/{__version__}",
+                },
+                trace_configs=[self._trace_config()],
+            )
+            self._should_reset_connector = False
+        
+        return self._session
+    
+    async def make_request(self, bot, method, timeout=None):
+        api_method = method.__api_method__
+        if timeout is None:
+            timeout = self.method_timeouts.get(api_method)
+        
+        started = time.perf_counter()
+        try:
+            result = await super().make_request(bot, method, timeout=timeout)
+            self.stats.last_success[api_method] = time.time()
+            return result
+        except Exception:
+            self.stats.errors += 1
+            raise
+        finally:
+            self.stats.observe(api_method, time.perf_counter() - started)
+    
+    def _trace_config(self):
+        """Подсчёт новых и переиспользованных соединений пула"""
+        trace_config = TraceConfig()
+        
+        async def on_connection_create_end(session, context, params):
+            self.stats.connections_created += 1
+        
+        async def on_connection_reuseconn(session, context, params):
+            self.stats.connections_reused += 1
+        
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        return trace_config
+
+def create_bot_session(**kwargs):
+    """Сессия бота с параметрами из конфигурации"""
+    if BOT_API_URL:
+        kwargs.setdefault("api", TelegramAPIServer.from_base(BOT_API_URL))
+        logger.info(f"🌐 Используется сервер Bot API: {BOT_API_URL}")
+    
+    return TunedAiohttpSession(
+        limit=SESSION_POOL_LIMIT,
+        keepalive_timeout=SESSION_KEEPALIVE,
+        dns_ttl=SESSION_DNS_TTL,
+        timeout=SESSION_TIMEOUT,
+        method_timeouts=SESSION_METHOD_TIMEOUTS,
+        **kwargs
+    )
\ No newline at end of file
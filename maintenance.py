@@ -0,0 +1,120 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+from db_handler import db
+from config import (
+    MAINTENANCE_START_HOUR,
+    MAINTENANCE_END_HOUR,
+    MAINTENANCE_BUDGET,
+    MAINTENANCE_VACUUM_PAGES,
+    MAINTENANCE_FULL_VACUUM_MAX_MB,
+    MAINTENANCE_VACUUM_MB_PER_SEC,
+)
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Основные запросы бота: их планы сравниваются до и после обслуживания
+PLAN_QUERIES = {
+    "Задачи пользователя": (
+        "SELECT id FROM tasks WHERE user_id = ? AND done = 0 ORDER BY deadline",
+        (0,)
+    ),
+    "Повестка": (
+        "SELECT id FROM tasks WHERE user_id = ? AND done = 0 AND deadline >= ? AND deadline < ? ORDER BY deadline LIMIT 101",
+        (0, "", "")
+    ),
+    "Наступившие напоминания": (
+        "SELECT id FROM tasks WHERE next_fire_at <= ? ORDER BY next_fire_at LIMIT 100",
+        (0,)
+    ),
+    "Категории": (
+        "SELECT name FROM categories WHERE user_id = ? ORDER BY usage_count DESC, last_used_at DESC LIMIT 9",
+        (0,)
+    ),
+    "Архивация": (
+        "SELECT id FROM tasks WHERE done = 1 AND auto_closed = 0 AND updated_at < ? LIMIT 500",
+        ("",)
+    ),
+}
+
+def in_window(now, start_hour, end_hour):
+    """Попадает ли время в окно обслуживания (окно может переходить через полночь)"""
+    if start_hour <= end_hour:
+        return start_hour <= now.hour < end_hour
+    return now.hour >= start_hour or now.hour < end_hour
+
+def window_start(now, start_hour, end_hour):
+    """Дата начала текущего окна: после полуночи окно, начатое вчера, ещё вчерашнее"""
+    if start_hour > end_hour and now.hour < end_hour:
+        return now.date() - timedelta(days=1)
+    return now.date()
+
+def query_plans():
+    return {name: db.query_plan(query, params) for name, (query, params) in PLAN_QUERIES.items()}
+
+async def run_maintenance(budget=MAINTENANCE_BUDGET):
+    """Одно обслуживание базы; шаги идут по очереди, пока не исчерпан бюджет времени (сек)"""
+    started = time.monotonic()
+    before = db.storage_stats()
+    plans_before = query_plans()
+    
+    def remaining():
+        return budget - (time.monotonic() - started)
+    
+    # Старую базу без auto_vacuum переводим в инкрементальный режим, только если она небольшая
+    # и полный VACUUM по оценке укладывается в бюджет; сам VACUUM идёт в рабочем потоке
+    if db.auto_vacuum_mode() == 0 and before and before["bytes"] <= MAINTENANCE_FULL_VACUUM_MAX_MB * 1024 * 1024:
+        estimate = before["bytes"] / 1024 / 1024 / MAINTENANCE_VACUUM_MB_PER_SEC
+        if estimate <= remaining():
+            await asyncio.to_thread(db.enable_incremental_vacuum)
+        else:
+            logger.info(f"🧹 Перевод в INCREMENTAL отложен: VACUUM ~{estimate:.1f} с не укладывается в бюджет")
+    
+    db.analyze()
+    await asyncio.sleep(0)
+    db.optimize()
+    await asyncio.sleep(0)
+    db.checkpoint()
+    
+    freed = 0
+    if db.auto_vacuum_mode() == 2:
+        while remaining() > 0:
+            step = db.incremental_vacuum(MAINTENANCE_VACUUM_PAGES)
+            freed += step
+            if step < MAINTENANCE_VACUUM_PAGES:
+                break
+            await asyncio.sleep(0)
+    
+    after = db.storage_stats()
+    if before and after:
+        logger.info(
+            f"🧹 Обслуживание базы за {time.monotonic() - started:.2f} с: "
+            f"{before['bytes'] / 1024:.0f} КБ -> {after['bytes'] / 1024:.0f} КБ, "
+            f"свободных страниц {before['free_pages']} -> {after['free_pages']}, освобождено {freed}"
+        )
+    
+    for name, plan in query_plans().items():
+        if plan != plans_before[name]:
+            logger.info(f"🧭 План запроса «{name}» изменился: {plans_before[name]} -> {plan}")
+
+async def maintenance_loop():
+    """Цикл обслуживания базы: раз в сутки в окне низкой нагрузки"""
+    logger.info(f"🧹 Запущен цикл обслуживания базы (окно {MAINTENANCE_START_HOUR}:00-{MAINTENANCE_END_HOUR}:00)")
+    last_run = None
+    
+    while True:
+        try:
+            now = datetime.now()
+            if in_window(now, MAINTENANCE_START_HOUR, MAINTENANCE_END_HOUR):
+                # Окно через полночь — одно обслуживание, поэтому отмечаем дату начала окна, а не сегодняшнюю
+                window = window_start(now, MAINTENANCE_START_HOUR, MAINTENANCE_END_HOUR)
+                if last_run != window:
+                    await run_maintenance()
+                    last_run = window
+            
+            await asyncio.sleep(600)  # Проверяем окно раз в 10 минут
+        
+        except Exception as e:
+            logger.error(f"❌ Ошибка обслуживания базы: {e}")
+            await asyncio.sleep(600)
\ No newline at end of file
@@ -0,0 +1,148 @@
+import asyncio
+import time
+import logging
+from collections import deque
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import CallbackQuery, Message
+
+logger = logging.getLogger(__name__)
+
+class QueueStats:
+    """Метрики очередей: время ожидания обновления до начала обработки"""
+    
+    def __init__(self, window=1000):
+        self.processed = 0
+        self.dropped = 0
+        self.max_wait = 0.0
+        self._waits = deque(maxlen=window)  # Последние значения для перцентилей
+    
+    def observe(self, wait):
+        """Учёт времени ожидания одного обновления (сек)"""
+        self.processed += 1
+        self.max_wait = max(self.max_wait, wait)
+        self._waits.append(wait)
+    
+    def snapshot(self):
+        """Текущие значения метрик (время в мс)"""
+        waits = sorted(self._waits)
+        
+        def percentile(p):
+            return waits[min(int(len(waits) * p), len(waits) - 1)] * 1000 if waits else 0.0
+        
+        return {
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "wait_p50_ms": percentile(0.5),
+            "wait_p95_ms": percentile(0.95),
+            "wait_max_ms": self.max_wait * 1000,
+        }
+
+class UserQueueMiddleware(BaseMiddleware):
+    """Обработка обновлений одного пользователя по порядку, разных пользователей — параллельно"""
+    
+    def __init__(self, max_depth=10, report_every=1000):
+        self.max_depth = max_depth
+        self.report_every = report_every
+        self.stats = QueueStats()
+        self._locks = {}   # user_id -> asyncio.Lock (очередь FIFO ожидающих)
+        self._depths = {}  # user_id -> обновлений в обработке и в очереди
+    
+    async def __call__(self, handler, event, data):
+        user = data.get("event_from_user")
+        if user is None:
+            return await handler(event, data)
+        
+        key = user.id
+        depth = self._depths.get(key, 0)
+        
+        # Ограничение глубины очереди: лишние обновления от одного пользователя отбрасываются
+        if depth >= self.max_depth:
+            self.stats.dropped += 1
+            logger.warning(f"🚧 Очередь пользователя {key} переполнена ({depth}), обновление отброшено")
+            return None
+        
+        self._depths[key] = depth + 1
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        queued_at = time.monotonic()
+        
+        try:
+            async with lock:
+                self.stats.observe(time.monotonic() - queued_at)
+                if self.stats.processed % self.report_every == 0:
+                    logger.info(f"📊 Очереди пользователей: {self.stats.snapshot()}")
+                return await handler(event, data)
+        finally:
+            # Пустые очереди удаляем, чтобы состояние не росло с числом пользователей
+            self._depths[key] -= 1
+            if not self._depths[key]:
+                del self._depths[key]
+                del self._locks[key]
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """Ограничение частоты запросов: token bucket на пользователя и группу обработчиков.
+    
+    Группа задаётся флагом обработчика: flags={"throttling": "heavy"}; по умолчанию — "default".
+    budgets — {группа: (пополнение токенов в секунду, ёмкость)}.
+    """
+    
+    def __init__(self, budgets, prune_every=1000):
+        self.budgets = budgets
+        self.prune_every = prune_every
+        self.dropped = 0
+        self._buckets = {}  # (user_id, группа) -> [токены, время последнего обновления, уведомлён]
+        self._calls = 0
+    
+    async def __call__(self, handler, event, data):
+        user = data.get("event_from_user")
+        if user is None:
+            return await handler(event, data)
+        
+        name = get_flag(data, "throttling", default="default")
+        rate, burst = self.budgets.get(name, self.budgets["default"])
+        now = time.monotonic()
+        
+        self._calls += 1
+        if self._calls % self.prune_every == 0:
+            self._prune(now)
+        
+        key = (user.id, name)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [float(burst), now, False]
+        else:
+            bucket[0] = min(float(burst), bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+        
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            bucket[2] = False
+            return await handler(event, data)
+        
+        self.dropped += 1
+        
+        # Одно уведомление на серию отброшенных запросов, остальные молча игнорируются
+        if not bucket[2]:
+            bucket[2] = True
+            wait = max(int((1 - bucket[0]) / rate) + 1, 1)
+            await self._notify(event, wait)
+        
+        logger.warning(f"🚦 Запрос пользователя {user.id} ({name}) отброшен ограничителем")
+        return None
+    
+    async def _notify(self, event, wait):
+        """Сообщение пользователю о превышении лимита (для callback — всплывающее уведомление)"""
+        if isinstance(event, (Message, CallbackQuery)):
+            await event.answer(f"⏳ Слишком много запросов. Попробуйте через {wait} сек.")
+    
+    def _prune(self, now):
+        """Удаление простаивающих корзин: за это время они всё равно наполнились бы полностью"""
+        expired = []
+        for key, (_, updated, _) in self._buckets.items():
+            rate, burst = self.budgets.get(key[1], self.budgets["default"])
+            if now - updated > burst / rate:
+                expired.append(key)
+        
+        for key in expired:
+            del self._buckets[key]
\ No newline at end of file
@@ -0,0 +1,90 @@
+import asyncio
+import os
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Одновременно выполняется только одно профилирование
+_profile_lock = asyncio.Lock()
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}"
+
+def sample_stacks(thread_id, duration, interval):
+    """Сэмплирование стека потока: Counter свёрнутых стеков (корень;...;лист) и число снимков"""
+    stacks = Counter()
+    samples = 0
+    deadline = time.monotonic() + duration
+    
+    while time.monotonic() < deadline:
+        frame = sys._current_frames().get(thread_id)
+        if frame is not None:
+            names = []
+            while frame is not None:
+                names.append(_frame_name(frame))
+                frame = frame.f_back
+            stacks[";".join(reversed(names))] += 1
+            samples += 1
+        time.sleep(interval)
+    
+    return stacks, samples
+
+async def profile_loop(duration=10, interval=0.005):
+    """Профиль потока цикла событий за duration секунд (текстовый отчёт)"""
+    async with _profile_lock:
+        thread_id = threading.get_ident()
+        # Сэмплер работает в отдельном потоке и снимает стек потока цикла, пока тот обслуживает бота
+        stacks, samples = await asyncio.to_thread(sample_stacks, thread_id, duration, interval)
+    
+    leaf = Counter()
+    for stack, count in stacks.items():
+        leaf[stack.rsplit(";", 1)[-1]] += count
+    
+    lines = [
+        f"Профиль цикла событий: {duration} с, интервал {interval * 1000:.0f} мс, снимков {samples}",
+        "",
+        "Самые частые функции на вершине стека (включая ожидание в select/epoll):",
+    ]
+    for name, count in leaf.most_common(30):
+        lines.append(f"{count / max(samples, 1):7.1%}  {name}")
+    
+    lines += ["", "Свёрнутые стеки (формат flamegraph.pl / speedscope):"]
+    lines += [f"{stack} {count}" for stack, count in stacks.most_common()]
+    return "\n".join(lines)
+
+async def memory_diff(duration=30, top=30, extra=None):
+    """Разница распределений памяти за duration секунд (tracemalloc) и текущие крупнейшие"""
+    async with _profile_lock:
+        started_here = not tracemalloc.is_tracing()
+        if started_here:
+            tracemalloc.start(10)
+        try:
+            before = tracemalloc.take_snapshot()
+            await asyncio.sleep(duration)
+            after = tracemalloc.take_snapshot()
+            traced, peak = tracemalloc.get_traced_memory()
+        finally:
+            # Трассировка памяти дорогая, поэтому работает только во время команды
+            if started_here:
+                tracemalloc.stop()
+    
+    rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    lines = [
+        f"Снимок памяти: окно {duration} с, пиковый RSS {rss_mb:.1f} МБ, "
+        f"отслежено {traced / 1024:.0f} КБ (пик {peak / 1024:.0f} КБ)",
+    ]
+    for name, value in (extra or {}).items():
+        lines.append(f"{name}: {value}")
+    
+    lines += ["", f"Рост распределений за окно (топ {top}):"]
+    lines += [str(stat) for stat in after.compare_to(before, "lineno")[:top]]
+    lines += ["", f"Крупнейшие распределения сейчас (топ {top}, только созданные за окно):"]
+    lines += [str(stat) for stat in after.statistics("lineno")[:top]]
+    return "\n".join(lines)
\ No newline at end of file
@@ -0,0 +1,64 @@
+import re
+from datetime import datetime
+
+from Keyboards import REPEAT_OPTIONS
+
+# Метки быстрого добавления: #категория !приоритет @ГГГГ-ММ-ДД [ЧЧ:ММ] ~повторение
+QUICK_ADD_TOKEN = re.compile(r"""
+    (?<!\S)(?:
+        \#(?P<category>[^\s#!@~]+)
+      | !(?P<priority>\S+)
+      | @(?P<date>\d{4}-\d{2}-\d{2})(?:\s+(?P<time>\d{1,2}:\d{2}))?
+      | ~(?P<repeat>\S+)
+    )(?!\S)
+""", re.VERBOSE)
+
+# Написание приоритета в строке (без учёта регистра) -> значение в БД
+PRIORITY_ALIASES = {
+    "высокий": "Высокий", "в": "Высокий", "high": "Высокий", "1": "Высокий",
+    "средний": "Средний", "с": "Средний", "medium": "Средний", "2": "Средний",
+    "низкий": "Низкий", "н": "Низкий", "low": "Низкий", "3": "Низкий",
+}
+REPEAT_ALIASES = {option.lower(): option for option in REPEAT_OPTIONS}
+
+# Время по умолчанию, если в @дате указан только день
+DEFAULT_TIME = "23:59"
+
+def parse_line(line):
+    """Разбор одной строки в поля задачи; ValueError с понятным текстом при ошибке"""
+    task = {"deadline": None, "category": None, "priority": None, "repeat": "Нет"}
+    
+    for match in QUICK_ADD_TOKEN.finditer(line):
+        if match["category"]:
+            task["category"] = match["category"].replace("_", " ")
+        elif match["priority"]:
+            task["priority"] = PRIORITY_ALIASES.get(match["priority"].lower())
+            if task["priority"] is None:
+                raise ValueError(f"неизвестный приоритет «{match['priority']}»")
+        elif match["date"]:
+            try:
+                deadline = datetime.strptime(f"{match['date']} {match['time'] or DEFAULT_TIME}", "%Y-%m-%d %H:%M")
+            except ValueError:
+                raise ValueError(f"неверная дата «{match.group().strip()}»")
+            task["deadline"] = deadline.isoformat()
+        else:
+            task["repeat"] = REPEAT_ALIASES.get(match["repeat"].lower())
+            if task["repeat"] is None:
+                raise ValueError(f"неизвестное повторение «{match['repeat']}»")
+    
+    task["text"] = " ".join(QUICK_ADD_TOKEN.sub(" ", line).split())
+    if not task["text"]:
+        raise ValueError("нет текста задачи")
+    return task
+
+def parse_message(text):
+    """Разбор сообщения: каждая непустая строка — задача. Возвращает (задачи, ошибки)"""
+    tasks, errors = [], []
+    for number, line in enumerate(text.splitlines(), 1):
+        if not line.strip():
+            continue
+        try:
+            tasks.append(parse_line(line))
+        except ValueError as e:
+            errors.append((number, line.strip(), str(e)))
+    return tasks, errors
\ No newline at end of file
@@ -0,0 +1,114 @@
+import gzip
+import hmac
+import json
+import logging
+import os
+import re
+import time
+from hashlib import sha256
+
+from aiogram import BaseMiddleware
+
+logger = logging.getLogger(__name__)
+
+USER_FIELDS = {"from", "chat", "user", "sender_chat"}  # Объекты с id пользователя или чата
+TEXT_FIELDS = {"text", "caption", "query"}              # Свободный текст пользователя
+NAME_FIELDS = {"first_name", "last_name", "username", "title"}
+LETTERS = re.compile(r"[^\W\d_]")
+
+def anonymize_id(value, secret):
+    """Стабильный псевдоним id: один и тот же при одинаковом секрете, необратим без него"""
+    digest = hmac.new(secret, str(value).encode(), sha256).digest()
+    return int.from_bytes(digest[:6], "big")
+
+def anonymize_text(text, known_texts):
+    """Кнопки и команды сохраняются, в остальном тексте буквы заменяются (цифры и знаки остаются)"""
+    if text in known_texts:
+        return text
+    if text.startswith("/"):
+        command, _, rest = text.partition(" ")
+        return f"{command} {LETTERS.sub('x', rest)}" if rest else command
+    return LETTERS.sub("x", text)
+
+def anonymize(value, secret, known_texts):
+    """Рекурсивная анонимизация JSON-представления обновления"""
+    if isinstance(value, list):
+        return [anonymize(item, secret, known_texts) for item in value]
+    if not isinstance(value, dict):
+        return value
+    
+    result = {}
+    for key, item in value.items():
+        if key in USER_FIELDS and isinstance(item, dict):
+            item = dict(item)
+            if "id" in item:
+                item["id"] = anonymize_id(item["id"], secret)
+            for name in NAME_FIELDS & item.keys():
+                item[name] = "x"
+            result[key] = anonymize(item, secret, known_texts)
+        elif key in TEXT_FIELDS and isinstance(item, str):
+            result[key] = anonymize_text(item, known_texts)
+        else:
+            result[key] = anonymize(item, secret, known_texts)
+    return result
+
+def keyboard_texts(*markups):
+    """Тексты кнопок обычных клавиатур — их можно записывать без анонимизации"""
+    return {button.text for markup in markups for row in markup.keyboard for button in row}
+
+class UpdateRecorder(BaseMiddleware):
+    """Запись входящих обновлений в сжатый JSONL для воспроизведения нагрузки.
+    
+    Каждая строка — {"ts": время получения, "update": обновление}; id пользователей
+    заменяются HMAC-псевдонимами, свободный текст маскируется.
+    """
+    
+    def __init__(self, path, secret=None, known_texts=(), flush_every=1000):
+        self.path = path
+        self.known_texts = set(known_texts)
+        self.flush_every = flush_every
+        self.recorded = 0
+        self._file = None
+        
+        if secret:
+            self.secret = secret.encode()
+        else:
+            # Без постоянного секрета псевдонимы нельзя сопоставить с копией базы при воспроизведении
+            self.secret = os.urandom(32)
+            logger.warning("⚠️ UPDATE_LOG_SECRET не задан: псевдонимы пользователей действуют только до перезапуска")
+    
+    async def __call__(self, handler, event, data):
+        try:
+            self.record(event)
+        except Exception as e:
+            logger.error(f"❌ Ошибка записи обновления {event.update_id}: {e}")
+        return await handler(event, data)
+    
+    def record(self, update):
+        """Запись одного обновления"""
+        if self._file is None:
+            # Режим дозаписи: каждый запуск добавляет новый gzip-блок в тот же файл
+            self._file = gzip.open(self.path, "at", encoding="utf-8")
+            logger.info(f"📼 Запись обновлений в {self.path}")
+        
+        payload = update.model_dump(mode="json", exclude_none=True, by_alias=True)
+        payload = anonymize(payload, self.secret, self.known_texts)
+        self._file.write(json.dumps({"ts": time.time(), "update": payload}, ensure_ascii=False) + "\n")
+        
+        self.recorded += 1
+        if self.recorded % self.flush_every == 0:
+            self._file.flush()
+    
+    def close(self):
+        """Сброс буфера и закрытие файла"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            logger.info(f"📼 Записано обновлений: {self.recorded}")
+
+def read_log(path):
+    """Записи журнала обновлений по порядку"""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
\ No newline at end of file
@@ -0,0 +1,57 @@
+import calendar
+from datetime import datetime, timedelta
+
+# Правила повторения: значение поля repeat -> (единица, шаг)
+REPEAT_RULES = {
+    "Ежедневно": ("days", 1),
+    "Еженедельно": ("days", 7),
+    "Ежемесячно": ("months", 1),
+}
+
+def is_recurring(repeat):
+    """Является ли значение repeat правилом повторения"""
+    return repeat in REPEAT_RULES
+
+def add_months(dt, months):
+    """Сдвиг на календарные месяцы с учётом длины месяца (31 января -> 28/29 февраля)"""
+    month_index = dt.month - 1 + months
+    year = dt.year + month_index // 12
+    month = month_index % 12 + 1
+    day = min(dt.day, calendar.monthrange(year, month)[1])
+    return dt.replace(year=year, month=month, day=day)
+
+def occurrence_deadline(anchor, repeat, n):
+    """Дедлайн n-го повторения, считая от первого дедлайна (anchor)"""
+    unit, step = REPEAT_RULES[repeat]
+    if unit == "days":
+        return anchor + timedelta(days=step * n)
+    return add_months(anchor, step * n)
+
+def next_occurrence(anchor, repeat, occurrence, after):
+    """Первое повторение с номером больше occurrence, которое наступает позже after: (номер, дедлайн)"""
+    unit, step = REPEAT_RULES[repeat]
+    n = occurrence + 1
+    
+    # Пропущенные за время простоя периоды перескакиваем сразу, без перебора каждого
+    if unit == "days":
+        n = max(n, (after - anchor) // timedelta(days=step) + 1)
+    else:
+        n = max(n, ((after.year - anchor.year) * 12 + after.month - anchor.month) // step)
+    
+    while occurrence_deadline(anchor, repeat, n) <= after:
+        n += 1
+    
+    return n, occurrence_deadline(anchor, repeat, n)
+
+def next_task_occurrence(task, after=None):
+    """Следующее повторение задачи (номер, дедлайн ISO) или None, если задача не повторяется"""
+    if not is_recurring(task['repeat']) or not task['deadline']:
+        return None
+    
+    try:
+        anchor = datetime.fromisoformat(task['repeat_anchor'] or task['deadline'])
+    except (ValueError, TypeError):
+        return None
+    
+    n, deadline = next_occurrence(anchor, task['repeat'], task['occurrence'] or 0, after or datetime.now())
+    return n, deadline.isoformat()
\ No newline at end of file
@@ -1,53 +1,26 @@
 import asyncio
-from datetime import datetime, timedelta
-from db_handler import db
+import time
+from datetime import datetime
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+from db_handler import db, compute_next_fire_at
+from recurrence import next_task_occurrence
+from config import REMINDER_BATCH_SIZE, REMINDER_LEASE, REMINDER_MAX_ATTEMPTS
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Время завершения последнего цикла напоминаний (для проверки готовности)
+reminder_status = {"last_cycle_at": None}
+
 async def reminder_loop(bot):
     """Цикл проверки напоминаний"""
     logger.info("⏰ Запущен цикл напоминаний")
     
     while True:
         try:
-            tasks = db.get_tasks_with_deadline()
-            now = datetime.now()
-            
-            for task in tasks:
-                task_id = task['id']
-                user_id = task['user_id']
-                text = task['text']
-                deadline_str = task['deadline']
-                repeat = task['repeat']
-                
-                if deadline_str:
-                    try:
-                        deadline = datetime.fromisoformat(deadline_str)
-                        
-                        # Проверяем, если дедлайн наступил или просрочен
-                        if now >= deadline:
-                            # Отправляем уведомление
-                            await bot.send_message(
-                                user_id,
-                                f"⏰ **Дедлайн!**\n\n"
-                                f"Задача: {text}\n"
-                                f"Срок: {deadline.strftime('%d.%m.%Y %H:%M')}\n\n"
-                                f"Задача автоматически помечена как выполненная."
-                            )
-                            
-                            # Помечаем как выполненную
-                            db.mark_done(task_id)
-                            
-                            logger.info(f"📨 Отправлено напоминание для задачи {task_id} пользователю {user_id}")
-                            
-                            # Обработка повторяющихся задач
-                            if repeat and repeat != "Нет":
-                                await handle_repeated_task(task, deadline)
-                                
-                    except (ValueError, TypeError) as e:
-                        logger.error(f"❌ Ошибка обработки дедлайна задачи {task_id}: {e}")
-                        continue
+            enqueue_due_reminders()
+            await deliver_reminders(bot)
+            reminder_status["last_cycle_at"] = time.time()
             
             # Ждем 60 секунд перед следующей проверкой
             await asyncio.sleep(60)
@@ -56,34 +29,102 @@ async def reminder_loop(bot):
             logger.error(f"❌ Критическая ошибка в reminder_loop: {e}")
             await asyncio.sleep(300)  # Ждем 5 минут при ошибке
 
-async def handle_repeated_task(task, old_deadline):
-    """Обработка повторяющихся задач"""
-    try:
-        repeat = task['repeat']
-        new_deadline = old_deadline
+def enqueue_due_reminders():
+    """Постановка наступивших напоминаний в очередь отправки"""
+    now = time.time()
+    
+    while True:
+        # Выбираются только созревшие напоминания, а не все задачи с дедлайном
+        tasks = db.get_due_reminders(now, REMINDER_BATCH_SIZE)
+        if not tasks:
+            return
         
-        if repeat == "Ежедневно":
-            new_deadline = old_deadline + timedelta(days=1)
-        elif repeat == "Еженедельно":
-            new_deadline = old_deadline + timedelta(weeks=1)
-        elif repeat == "Ежемесячно":
-            # Просто добавляем 30 дней для упрощения
-            new_deadline = old_deadline + timedelta(days=30)
+        queued = db.enqueue_reminders([plan_reminder(task, now) for task in tasks])
+        logger.info(f"📥 В очередь поставлено напоминаний: {queued}")
         
-        # Создаем новую задачу с новым дедлайном
-        db.add_task(
-            user_id=task['user_id'],
-            text=task['text'],
-            deadline=new_deadline.isoformat(),
-            category=None,  # Можно добавить получение категории из БД
-            priority=None,  # Можно добавить получение приоритета из БД
-            repeat=repeat
-        )
+        if queued == 0 or len(tasks) < REMINDER_BATCH_SIZE:
+            return
+
+def plan_reminder(task, now):
+    """Вид напоминания и следующее состояние задачи: (задача, вид, next_fire_at, следующее повторение)"""
+    deadline_ts = compute_next_fire_at(task['deadline'], "0")
+    
+    if deadline_ts is not None and now < deadline_ts:
+        # Предварительное напоминание: переходим к следующему смещению (или к самому дедлайну)
+        return (task, "before", compute_next_fire_at(task['deadline'], task['reminder_offsets'], after=now), None)
+    
+    # Повторяющаяся задача не закрывается, а переносится на следующий срок по правилу
+    occurrence = next_task_occurrence(task, datetime.fromtimestamp(now))
+    if occurrence:
+        return (task, "repeat", None, occurrence)
+    
+    return (task, "deadline", None, None)
+
+async def deliver_reminders(bot):
+    """Отправка напоминаний из очереди пачками"""
+    while True:
+        reminders = db.claim_reminders(REMINDER_BATCH_SIZE, REMINDER_LEASE)
+        if not reminders:
+            return
         
-        logger.info(f"🔄 Создана повторяющаяся задача для пользователя {task['user_id']}")
+        for reminder in reminders:
+            task_id = reminder['task_id']
+            user_id = reminder['user_id']
+            
+            try:
+                await bot.send_message(user_id, format_reminder(reminder))
+                logger.info(f"📨 Отправлено напоминание для задачи {task_id} пользователю {user_id}")
+                
+            except TelegramRetryAfter as e:
+                # Остаток пачки вернётся в очередь по истечении аренды
+                logger.warning(f"⏳ Превышен лимит отправки, пауза {e.retry_after} сек")
+                await asyncio.sleep(e.retry_after)
+                return
+            except (TelegramForbiddenError, TelegramBadRequest, ValueError, TypeError) as e:
+                # Повторная отправка не поможет (бот заблокирован, чат не найден, битый дедлайн)
+                logger.error(f"❌ Напоминание для задачи {task_id} не может быть доставлено: {e}")
+            except Exception as e:
+                if reminder['attempts'] < REMINDER_MAX_ATTEMPTS:
+                    logger.error(f"❌ Ошибка отправки напоминания для задачи {task_id}, будет повтор: {e}")
+                    continue
+                logger.error(f"❌ Напоминание для задачи {task_id} отброшено после {reminder['attempts']} попыток: {e}")
+            
+            # Подтверждаем сразу после отправки, чтобы сбой не привёл к повтору
+            db.ack_reminder(reminder['id'])
         
-    except Exception as e:
-        logger.error(f"❌ Ошибка обработки повторяющейся задачи: {e}")
+        if len(reminders) < REMINDER_BATCH_SIZE:
+            return
+
+def format_reminder(reminder):
+    """Текст напоминания в зависимости от его вида"""
+    deadline = datetime.fromisoformat(reminder['deadline'])
+    
+    if reminder['kind'] == "before":
+        minutes_left = max(int((deadline - datetime.now()).total_seconds() // 60), 0)
+        hours, minutes = divmod(minutes_left, 60)
+        left = f"{hours} ч {minutes} мин" if hours else f"{minutes} мин"
+        return (
+            f"🔔 <b>Скоро дедлайн!</b>\n\n"
+            f"Задача: {reminder['text']}\n"
+            f"Срок: {deadline.strftime('%d.%m.%Y %H:%M')}\n"
+            f"Осталось: {left}"
+        )
+    
+    if reminder['kind'] == "repeat":
+        next_deadline = datetime.fromisoformat(reminder['next_deadline'])
+        return (
+            f"⏰ <b>Дедлайн!</b>\n\n"
+            f"Задача: {reminder['text']}\n"
+            f"Срок: {deadline.strftime('%d.%m.%Y %H:%M')}\n\n"
+            f"🔄 Следующий срок: {next_deadline.strftime('%d.%m.%Y %H:%M')}"
+        )
+    
+    return (
+        f"⏰ <b>Дедлайн!</b>\n\n"
+        f"Задача: {reminder['text']}\n"
+        f"Срок: {deadline.strftime('%d.%m.%Y %H:%M')}\n\n"
+        f"Задача закрыта и ждёт подтверждения в «⚠️ Просрочено»."
+    )
 
 async def send_reminder(bot, user_id, text, deadline):
     """Отправка разового напоминания"""
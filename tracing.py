@@ -0,0 +1,172 @@
+import inspect
+import json
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+import logging
+
+logger = logging.getLogger(__name__)
+
+_current_span = ContextVar("current_span", default=None)
+_trace_spans = ContextVar("trace_spans", default=None)
+
+class Span:
+    """Отрезок времени внутри трассы одного обновления"""
+    
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start", "end", "attributes")
+    
+    def __init__(self, name, trace_id, parent_id, attributes):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.start = time.time_ns()
+        self.end = None
+        self.attributes = attributes
+    
+    @property
+    def duration_ms(self):
+        return (self.end - self.start) / 1e6
+    
+    def to_dict(self):
+        """Представление в духе OTLP JSON (одна строка файла — один span)"""
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id,
+            "name": self.name,
+            "startTimeUnixNano": self.start,
+            "endTimeUnixNano": self.end,
+            "durationMs": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+        }
+
+class Tracer:
+    """Трассировка обновлений с выборкой по завершении трассы.
+    
+    Трасса сохраняется целиком с вероятностью sample_rate, а медленная
+    (дольше slow_ms) или завершившаяся ошибкой — всегда.
+    """
+    
+    def __init__(self, path, sample_rate=0.01, slow_ms=1000):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.exported = 0
+        self._file = None
+    
+    @contextmanager
+    def span(self, name, root=False, **attributes):
+        """Span внутри текущей трассы; root=True начинает новую трассу"""
+        parent = _current_span.get()
+        if parent is None and not root:
+            # Вне обновления (фоновые циклы) дочерние span не создаются
+            yield None
+            return
+        
+        trace_id = f"{random.getrandbits(128):032x}" if parent is None else parent.trace_id
+        span = Span(name, trace_id, parent.span_id if parent else None, attributes)
+        span_token = _current_span.set(span)
+        spans_token = _trace_spans.set([]) if parent is None else None
+        
+        try:
+            yield span
+        except BaseException as e:
+            span.attributes["error"] = repr(e)
+            raise
+        finally:
+            span.end = time.time_ns()
+            spans = _trace_spans.get()
+            spans.append(span)
+            _current_span.reset(span_token)
+            if spans_token is not None:
+                _trace_spans.reset(spans_token)
+                self._finish_trace(span, spans)
+    
+    def _finish_trace(self, root, spans):
+        """Решение о сохранении трассы после её завершения"""
+        failed = any("error" in span.attributes for span in spans)
+        if not failed and root.duration_ms < self.slow_ms and random.random() >= self.sample_rate:
+            return
+        
+        try:
+            if self._file is None:
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write("".join(json.dumps(span.to_dict(), ensure_ascii=False) + "\n" for span in spans))
+            self._file.flush()
+            self.exported += 1
+        except Exception as e:
+            logger.error(f"❌ Ошибка записи трассы: {e}")
+    
+    def close(self):
+        """Закрытие файла трасс"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            logger.info(f"🧵 Сохранено трасс: {self.exported}")
+
+class TracingMiddleware(BaseMiddleware):
+    """Outer-middleware обновлений: корневой span на каждое обновление"""
+    
+    def __init__(self, tracer):
+        self.tracer = tracer
+    
+    async def __call__(self, handler, event, data):
+        user = data.get("event_from_user")
+        with self.tracer.span(
+            "update",
+            root=True,
+            update_id=event.update_id,
+            event_type=event.event_type,
+            user_id=user.id if user else None,
+        ):
+            return await handler(event, data)
+
+class HandlerTracingMiddleware(BaseMiddleware):
+    """Inner-middleware: span выбранного обработчика (отделяет его от ожидания в очереди и FSM)"""
+    
+    def __init__(self, tracer):
+        self.tracer = tracer
+    
+    async def __call__(self, handler, event, data):
+        with self.tracer.span(f"handler.{data['handler'].callback.__name__}"):
+            return await handler(event, data)
+
+class RequestTracingMiddleware(BaseRequestMiddleware):
+    """Middleware сессии бота: span на каждый запрос к Bot API"""
+    
+    def __init__(self, tracer):
+        self.tracer = tracer
+    
+    async def __call__(self, make_request, bot, method):
+        with self.tracer.span(f"api.{method.__api_method__}"):
+            return await make_request(bot, method)
+
+def instrument_database(database, tracer, exclude=("connect", "close")):
+    """Обёртка публичных методов Database: span на каждый вызов внутри трассы"""
+    
+    def traced(name, method):
+        # Генератор (iter_tasks) читает базу при итерации: span должен покрывать её, а не создание генератора
+        if inspect.isgeneratorfunction(method):
+            @wraps(method)
+            def generator_wrapper(*args, **kwargs):
+                with tracer.span(f"db.{name}"):
+                    yield from method(*args, **kwargs)
+            return generator_wrapper
+        
+        @wraps(method)
+        def wrapper(*args, **kwargs):
+            with tracer.span(f"db.{name}"):
+                return method(*args, **kwargs)
+        return wrapper
+    
+    for name in dir(type(database)):
+        method = getattr(database, name)
+        if name.startswith("_") or name in exclude or not callable(method):
+            continue
+        setattr(database, name, traced(name, method))
\ No newline at end of file